@@ -0,0 +1,236 @@
+"""Mergeable aggregate state for the sum/count/mean style card figures.
+
+The state is a set of small marginal tables, one per group of card
+questions: brand x region x stone x weekday, weight band x making-charge
+bucket, and weekday x day of month, each split by sale/return. Every row holds a row
+count plus the sum and sum of squares of each measure. Alongside them the
+state keeps, for the bill-level figures, the total discount of each bill
+of the latest day, and how many earlier bills fall in each discount band;
+and the sold items, discount and value per day x brand x region that the
+discount elasticity is fitted on. Two states merge by adding them, so a
+new day's transactions are folded in without rescanning the history.
+
+A bill's total can still change while rows for its day may arrive, so
+bills stay exact until a later day is merged; then they only add one to
+their band. The bill tables therefore stay the size of one day's bills
+plus a handful of bands, however many bills the history holds.
+
+A single table over all those keys together grows close to one row per
+transaction (about 110k cells for the 300k-row sample); the marginals stay
+at a few hundred to a few thousand cells each, however long the history
+gets.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_store import (
+    BILL, BRAND, CACHE_DIR, DATE, DISCOUNT, DISCOUNT_PCT, IS_RETURN, MAKING_CHARGES, REGION, SALES, STONE,
+    WEIGHT_BAND, refresh_incremental,
+)
+
+WEEKDAY = "weekday"
+DAY = "day"
+MC_BUCKET = "mc_bucket"
+COUNT = "count"
+
+# Keys of each marginal; a question is answered from any marginal holding
+# every key it filters or groups on. Weekday sits with the segment keys too,
+# so a brand x region slice can be read per day of the week
+MARGINALS = {
+    "segment": [BRAND, REGION, STONE, WEEKDAY, IS_RETURN],
+    "item": [WEIGHT_BAND, MC_BUCKET, IS_RETURN],
+    "calendar": [WEEKDAY, DAY, IS_RETURN],
+}
+KEYS = list(dict.fromkeys(key for keys in MARGINALS.values() for key in keys))
+MEASURES = [SALES, DISCOUNT, DISCOUNT_PCT]
+# Total discount over its sold items per bill of the latest day, and the
+# number of earlier bills per discount band. Bill i falls in band i when
+# BILL_EDGES[i - 1] < discount <= BILL_EDGES[i]
+BILLS = "bills"
+BILL_BANDS = "bill_bands"
+BILL_BAND = "discount_band"
+BILL_EDGES = [10_000, 25_000, 50_000, 75_000, 100_000, 150_000, 200_000]
+# Sold items, discount % total, net and gross value per day x brand x region
+DAILY = "daily"
+DAILY_COLUMNS = ["txns", "discount_pct_sum", "sales", "gross"]
+TABLE_KEYS = {**MARGINALS, BILLS: [DATE, BILL], BILL_BANDS: [BILL_BAND], DAILY: [DATE, BRAND, REGION]}
+SOURCE_COLUMNS = [DATE, BILL, BRAND, REGION, STONE, WEIGHT_BAND, MAKING_CHARGES, IS_RETURN] + MEASURES
+
+# Making charges fall in bucket i when MC_EDGES[i - 1] < charges <= MC_EDGES[i];
+# rows without making charges are kept apart rather than binned
+MC_EDGES = [10_000, 25_000, 50_000, 100_000]
+MC_BUCKETS = ["Up to ₹10k", "₹10k–25k", "₹25k–50k", "₹50k–1L", "Above ₹1L"]
+MC_UNKNOWN = "Unknown"
+
+STATE_PATH = os.path.join(CACHE_DIR, "aggregates")
+
+
+# ===================
+# STATE
+# ===================
+def _empty(name):
+    keys = TABLE_KEYS[name]
+    if name == BILLS:
+        columns = [DISCOUNT]
+    elif name == DAILY:
+        columns = DAILY_COLUMNS
+    elif name == BILL_BANDS:
+        columns = [COUNT]
+    else:
+        columns = [COUNT] + [f"{m}_{stat}" for m in MEASURES for stat in ("sum", "sumsq")]
+    index = pd.MultiIndex.from_arrays([[] for _ in keys], names=keys)
+    return pd.DataFrame(columns=columns, index=index, dtype="float64")
+
+
+def empty_state():
+    return {name: _empty(name) for name in TABLE_KEYS}
+
+
+def mc_buckets(making_charges):
+    making_charges = np.asarray(making_charges, dtype="float64")
+    buckets = np.array(MC_BUCKETS, dtype=object)[np.searchsorted(MC_EDGES, making_charges, side="left")]
+    buckets[np.isnan(making_charges)] = MC_UNKNOWN
+    return buckets
+
+
+def aggregate(df):
+    """Aggregate state of the transaction rows in ``df``."""
+    frame = pd.DataFrame({
+        WEEKDAY: df[DATE].dt.dayofweek.to_numpy(),
+        DAY: df[DATE].dt.day.to_numpy(),
+        BRAND: df[BRAND].astype(str).to_numpy(),
+        REGION: df[REGION].astype(str).to_numpy(),
+        STONE: df[STONE].astype(str).to_numpy(),
+        WEIGHT_BAND: df[WEIGHT_BAND].astype(str).to_numpy(),
+        MC_BUCKET: mc_buckets(df[MAKING_CHARGES]),
+        IS_RETURN: df[IS_RETURN].astype(bool).to_numpy(),
+        COUNT: 1.0,
+    })
+    for m in MEASURES:
+        values = df[m].to_numpy(dtype="float64")
+        frame[f"{m}_sum"] = values
+        frame[f"{m}_sumsq"] = values * values
+    values = [c for c in frame.columns if c not in KEYS]
+    state = {name: frame.groupby(keys, sort=False)[values].sum() for name, keys in MARGINALS.items()}
+    sold = df.loc[~df[IS_RETURN].astype(bool)]
+    bills = pd.DataFrame({
+        DATE: sold[DATE].dt.normalize().to_numpy(),
+        BILL: sold[BILL].astype(str).to_numpy(),
+        DISCOUNT: sold[DISCOUNT].to_numpy(dtype="float64"),
+    })
+    state[BILLS] = bills.groupby(TABLE_KEYS[BILLS], sort=False).sum()
+    state[BILL_BANDS] = _empty(BILL_BANDS)
+    daily = pd.DataFrame({
+        DATE: sold[DATE].dt.normalize().to_numpy(),
+        BRAND: sold[BRAND].astype(str).to_numpy(),
+        REGION: sold[REGION].astype(str).to_numpy(),
+        "txns": 1.0,
+        "discount_pct_sum": sold[DISCOUNT_PCT].to_numpy(dtype="float64"),
+        "sales": sold[SALES].to_numpy(dtype="float64"),
+        "gross": (sold[SALES] + sold[DISCOUNT]).to_numpy(dtype="float64"),
+    })
+    state[DAILY] = daily.groupby(TABLE_KEYS[DAILY], sort=False).sum()
+    return _close_bills(state)
+
+
+def _add(name, *frames):
+    parts = [frame for frame in frames if len(frame)]
+    return pd.concat(parts).groupby(level=TABLE_KEYS[name], sort=False).sum() if parts else _empty(name)
+
+
+def _close_bills(state):
+    # Bills from before the latest day are final: count them in their band
+    bills = state[BILLS]
+    if not len(bills):
+        return state
+    dates = bills.index.get_level_values(DATE)
+    closed = dates < dates.max()
+    if not closed.any():
+        return state
+    bands = np.searchsorted(BILL_EDGES, bills[DISCOUNT].to_numpy()[closed], side="left")
+    counts = pd.DataFrame({BILL_BAND: bands, COUNT: 1.0}).groupby([BILL_BAND]).sum()
+    return {**state, BILLS: bills[~closed], BILL_BANDS: _add(BILL_BANDS, state[BILL_BANDS], counts)}
+
+
+def merge(*states):
+    merged = {name: _add(name, *(state[name] for state in states)) for name in TABLE_KEYS}
+    return _close_bills(merged)
+
+
+def bills_over(state, threshold):
+    """Number of bills whose total discount is above ``threshold``, one of ``BILL_EDGES``."""
+    if threshold not in BILL_EDGES:
+        raise ValueError(f"Bill threshold {threshold} is not one of {BILL_EDGES}")
+    bands = state[BILL_BANDS][COUNT]
+    closed = bands[bands.index.get_level_values(BILL_BAND) > BILL_EDGES.index(threshold)].sum()
+    return int(closed) + int((state[BILLS][DISCOUNT] > threshold).sum())
+
+
+def cells(state):
+    """Total rows over every marginal of ``state`` (the per-bill and per-day tables aside)."""
+    return sum(len(state[name]) for name in MARGINALS)
+
+
+def rollup(marginal, by, where=None):
+    """Sum one ``marginal`` of the state over every key except ``by``, optionally filtered first.
+
+    ``where`` maps key names to a value or list of allowed values. The result
+    has ``count`` plus ``<measure>_mean`` and ``<measure>_std`` columns.
+    """
+    frame = marginal.reset_index()
+    for key, allowed in (where or {}).items():
+        allowed = allowed if isinstance(allowed, (list, tuple, set)) else [allowed]
+        frame = frame[frame[key].isin(allowed)]
+    totals = frame.groupby(by)[marginal.columns].sum() if by else frame[marginal.columns].sum().to_frame().T
+    out = totals[[COUNT]].copy()
+    n = totals[COUNT].replace(0, np.nan)
+    for m in MEASURES:
+        mean = totals[f"{m}_sum"] / n
+        out[f"{m}_sum"] = totals[f"{m}_sum"]
+        out[f"{m}_mean"] = mean
+        out[f"{m}_std"] = np.sqrt((totals[f"{m}_sumsq"] / n - mean**2).clip(lower=0))
+    return out
+
+
+# ===================
+# PERSISTENCE
+# ===================
+def _marginal_path(state_path, name):
+    return os.path.join(state_path, f"{name}.parquet")
+
+
+def load_state(state_path=STATE_PATH):
+    return {
+        name: pd.read_parquet(_marginal_path(state_path, name)).set_index(keys)
+        for name, keys in TABLE_KEYS.items()
+    }
+
+
+def save_state(state, state_path=STATE_PATH):
+    os.makedirs(state_path, exist_ok=True)
+    for name, frame in state.items():
+        path = _marginal_path(state_path, name)
+        frame.reset_index().to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+    return {"cells": {name: len(frame) for name, frame in state.items()}}
+
+
+def refresh(history_path, daily_dir, state_path=STATE_PATH):
+    """Bring the persisted state up to date and return it.
+
+    See ``data_store.refresh_incremental``: only new daily files are read,
+    and the state is rebuilt when the history or an ingested file changes.
+    """
+    state, _ = refresh_incremental(
+        history_path, daily_dir, os.path.join(state_path, "manifest.json"),
+        start=empty_state,
+        fold=lambda state, df: merge(state, aggregate(df)),
+        load=lambda manifest: load_state(state_path),
+        save=lambda state: save_state(state, state_path),
+        columns=SOURCE_COLUMNS,
+        # Written with other marginals or buckets: rebuild
+        version={"tables": TABLE_KEYS, "mc_buckets": [*MC_BUCKETS, MC_UNKNOWN], "bill_edges": BILL_EDGES},
+    )
+    return state
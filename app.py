@@ -1,12 +1,19 @@
 import streamlit as st
-import pandas as pd
-import random
 import datetime
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from streamlit_extras.annotated_text import annotated_text
-from streamlit_extras.colored_header import colored_header
+import os
+import functools
+import time
+from contextlib import contextmanager
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from telemetry import SamplingProfiler, Telemetry
+# Standard library only; the modules that need numpy, pandas or pyarrow are
+# imported in the functions that use them, on first use
+from outbox import EmailOutbox, SENT, FAILED
+from ledger import LEDGER_PATH, Ledger
+from catalog import Catalog
+from page_helpers import (
+    DEFAULT_METRICS, daily_fingerprint, fingerprint, fmt_inr, render_bullets, spike_days_text, spike_module,
+)
 
 # ===================
 # PAGE CONFIGURATION
@@ -17,70 +24,191 @@ st.set_page_config(
     page_icon="🛠️"
 )
 
-import base64
-
-# Load the image and convert to base64
-with open("titanLogo.png", "rb") as f:
-    data = f.read()
-    encoded = base64.b64encode(data).decode()
+def secret_flag(name, default=False):
+    # TOML booleans arrive as bool, environment-style secrets as strings like "false"
+    value = st.secrets.get(name, default)
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
 
-# Title with logo
-st.markdown(
-    f"""
-    <div style="width: 100%; display: flex; align-items: center; gap: 18px; margin-bottom: 8px;">
-        <div style="background-color: white; width: 65px; height: 65px; border-radius: 10%; display: flex; align-items: center; justify-content: center; flex-shrink: 0;">
-            <img src="data:image/png;base64,{encoded}" style="width: 50px; height: 50px;"/>
-        </div>
-        <div>
-            <div style="font-size: 2.2rem; font-weight: 800; color: white; line-height: 1.2;">
-                Immediate Next Action Plan
+# ===================
+# INSTRUMENTATION
+# ===================
+# Opt-in via secrets: METRICS_ENABLED turns on timings and counters,
+# METRICS_PORT serves them as Prometheus text on localhost, METRICS_LOG
+# appends JSON snapshots to a rotating log and PROFILER starts the sampling
+# profiler at boot (it can also be toggled from the Performance panel)
+@st.cache_resource
+def get_telemetry(port, log_path, log_interval):
+    telemetry = Telemetry()
+    if port:
+        telemetry.serve(port)
+    if log_path:
+        telemetry.log_every(log_path, log_interval)
+    return telemetry
+
+def get_telemetry_from_secrets():
+    if not secret_flag("METRICS_ENABLED"):
+        return None
+    return get_telemetry(
+        int(st.secrets.get("METRICS_PORT", 0)),
+        st.secrets.get("METRICS_LOG"),
+        float(st.secrets.get("METRICS_LOG_INTERVAL", 60)),
+    )
+
+@st.cache_resource
+def get_profiler(start):
+    profiler = SamplingProfiler()
+    if start:
+        profiler.start()
+    return profiler
+
+# A run is timed however it ends: at the bottom of the page, or early through
+# st.rerun() or an exception escaping a timed section or a fragment
+def fragment_run():
+    ctx = get_script_run_ctx()
+    return bool(ctx and ctx.fragment_ids_this_run)
+
+def finish_run():
+    global run_recorded
+    if telemetry and not run_recorded:
+        run_recorded = True
+        telemetry.observe("script_run_seconds", time.perf_counter() - run_started)
+
+@contextmanager
+def timed(section):
+    if not telemetry:
+        yield
+        return
+    with telemetry.timer("section_seconds", section=section):
+        try:
+            yield
+        except BaseException:
+            # st.rerun() and st.stop() raise too
+            if not fragment_run():
+                finish_run()
+            raise
+
+def fragment(func=None, **kwargs):
+    """``st.fragment`` whose reruns are timed as ``fragment_run_seconds``.
+
+    Fragment reruns skip the rest of the page, including ``finish_run``.
+    """
+    if func is None:
+        return functools.partial(fragment, **kwargs)
+
+    @functools.wraps(func)
+    def run(*args, **kw):
+        if not fragment_run():
+            try:
+                return func(*args, **kw)
+            except BaseException:
+                finish_run()
+                raise
+        started = time.perf_counter()
+        try:
+            return func(*args, **kw)
+        finally:
+            if telemetry:
+                telemetry.observe("fragment_run_seconds", time.perf_counter() - started)
+
+    return st.fragment(run, **kwargs)
+
+telemetry = get_telemetry_from_secrets()
+run_started = time.perf_counter()
+run_recorded = False
+if telemetry:
+    ctx = get_script_run_ctx()
+    telemetry.record_session_run(ctx.session_id if ctx else None)
+    get_profiler(secret_flag("PROFILER"))
+
+# Title with logo. The logo is served once by Streamlit's static file
+# serving (.streamlit/config.toml) and the stylesheet is read once per
+# process, so reruns only resend small markup
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+LOGO_URL = "app/static/titanLogo.png"
+
+@st.cache_data
+def page_css(css_path):
+    with open(css_path, encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
+
+with timed("header"):
+    st.markdown(page_css(os.path.join(APP_DIR, "static", "app.css")), unsafe_allow_html=True)
+
+    st.markdown(
+        f"""
+        <div style="width: 100%; display: flex; align-items: center; gap: 18px; margin-bottom: 8px;">
+            <div style="background-color: white; width: 65px; height: 65px; border-radius: 10%; display: flex; align-items: center; justify-content: center; flex-shrink: 0;">
+                <img src="{LOGO_URL}" style="width: 50px; height: 50px;"/>
             </div>
-            <div style="font-size: 1rem; color: #ddd; line-height: 1.4;">
-                Insights & action assignments with email notifications.
+            <div>
+                <div style="font-size: 2.2rem; font-weight: 800; color: white; line-height: 1.2;">
+                    Immediate Next Action Plan
+                </div>
+                <div style="font-size: 1rem; color: #ddd; line-height: 1.4;">
+                    Insights & action assignments with email notifications.
+                </div>
             </div>
         </div>
-    </div>
-    """,
-    unsafe_allow_html=True
-)
-
-# Custom CSS for popover button
-st.markdown(
-    """
-    <style>
-    /* Force styling for the popover button */
-    [data-testid="stPopover"] > div > button {
-        background: transparent !important;
-        border: 1.5px solid #ff4d4d !important;   /* Red border */
-        color: #ff4d4d !important;                /* Red text */
-        font-weight: 600 !important;
-        border-radius: 10px !important;
-        padding: 8px 16px !important;
-        transition: all 0.2s ease-in-out;
-    }
-
-    /* Hover effect */
-    [data-testid="stPopover"] > div > button:hover {
-        background: #ff4d4d20 !important;  /* light red background */
-        color: #ff4d4d !important;
-        border-color: #ff1a1a !important;
-    }
-    </style>
-    """,
-    unsafe_allow_html=True
-)
+        """,
+        unsafe_allow_html=True
+    )
 
 # ===================
 # EMAIL SENDING FUNCTION
 # ===================
+@st.cache_resource
+def get_ledger(path):
+    # One ledger (and one writer thread) shared by every session in the process
+    return Ledger(path)
+
+def get_ledger_from_secrets():
+    return get_ledger(st.secrets.get("LEDGER_PATH", LEDGER_PATH))
+
+@st.cache_resource
+def get_outbox(sender_email, password, host, port, use_ssl):
+    # One outbox (and one SMTP connection) shared by every session in the process;
+    # delivery results are written straight to the assignment ledger
+    return EmailOutbox(sender_email, password, host=host, port=port, use_ssl=use_ssl,
+                       on_status=get_ledger_from_secrets().update_status,
+                       telemetry=get_telemetry_from_secrets())
+
+def get_outbox_from_secrets():
+    return get_outbox(
+        st.secrets["EMAIL_SENDER"],
+        st.secrets["EMAIL_PASSWORD"],
+        st.secrets.get("SMTP_HOST", "smtp.gmail.com"),
+        int(st.secrets.get("SMTP_PORT", 465)),
+        secret_flag("SMTP_SSL", True),
+    )
+
+def team_recipients(team):
+    # Per-team lists come from the optional [TEAM_RECIPIENTS] table in secrets;
+    # teams without one fall back to EMAIL_RECEIVER
+    recipients = st.secrets.get("TEAM_RECIPIENTS", {}).get(team)
+    return list(recipients) if recipients else [st.secrets["EMAIL_RECEIVER"]]
+
+def build_email(sender_email, receivers, subject, body):
+    # Imported on the first send rather than on every cold start
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
+    msg = MIMEMultipart()
+    msg["From"] = sender_email
+    msg["To"] = ", ".join(receivers)
+    msg["Subject"] = subject
+    msg.attach(MIMEText(body, "plain"))
+    return msg
+
 def send_assignment_email(action, team, deadline, personalized_msg=""):
     try:
         sender_email = st.secrets["EMAIL_SENDER"]
-        receiver_email = st.secrets["EMAIL_RECEIVER"]
-        password = st.secrets["EMAIL_PASSWORD"]
+        receivers = team_recipients(team)
+        outbox = get_outbox_from_secrets()
     except KeyError as e:
         st.warning(f"Email credential {e} missing in Streamlit secrets. Please add it to your secrets.toml file.")
-        return False
+        return None
 
     subject = f"[Assignment Notification] '{action}' assigned to {team}"
 
@@ -100,261 +228,533 @@ Deadline: {deadline}
 
     body += "-- BI Team, Titan\n"
 
-    msg = MIMEMultipart()
-    msg["From"] = sender_email
-    msg["To"] = receiver_email
-    msg["Subject"] = subject
-    msg.attach(MIMEText(body, "plain"))
+    with timed("email_send"):
+        msg = build_email(sender_email, receivers, subject, body)
+
+        # Returns immediately; double-clicks and reruns resubmitting the same
+        # (action, team, date) get the original job back instead of a second email
+        job_id = outbox.submit(receivers, msg, dedupe_key=(action, team, str(deadline)))
+        get_ledger_from_secrets().record(job_id, [action], team, receivers, deadline)
+    return job_id
 
+def send_team_digests(assignments, deadline, personalized_msg=""):
+    """Queue one digest email per team for ``assignments`` ({team: [action, ...]}).
+
+    The digests are queued together and go out back to back over the
+    outbox's single SMTP connection. Returns {job_id: label}.
+    """
     try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(sender_email, password)
-            server.sendmail(sender_email, receiver_email, msg.as_string())
-        return True
-    except Exception as e:
-        st.error(f"Failed to send email: {e}")
-        return False
+        sender_email = st.secrets["EMAIL_SENDER"]
+        outbox = get_outbox_from_secrets()
+        items = []
+        labels = []
+        for team, actions in assignments.items():
+            subject = f"[Assignment Digest] {len(actions)} action(s) assigned to {team}"
+            body = f"""
+Hello,
+
+You assigned the following {len(actions)} action item(s):
+
+Assigned To Team: {team}
+Deadline: {deadline}
+
+"""
+            for number, action in enumerate(actions, start=1):
+                next_steps = "\n".join(f"    {bullet}" for bullet in get_next_actions(action))
+                body += f"{number}. {action}\n{next_steps}\n\n"
+            if personalized_msg.strip():
+                body += f"OTHER INSTRUCTIONS:\n{personalized_msg}\n\n"
+            body += "-- BI Team, Titan\n"
+
+            receivers = team_recipients(team)
+            msg = build_email(sender_email, receivers, subject, body)
+            items.append((receivers, msg, ("digest", team, tuple(sorted(actions)), str(deadline))))
+            labels.append(f"the {team} digest ({len(actions)} action(s))")
+    except KeyError as e:
+        st.warning(f"Email credential {e} missing in Streamlit secrets. Please add it to your secrets.toml file.")
+        return {}
+
+    with timed("email_digests"):
+        job_ids = outbox.submit_many(items)
+        ledger = get_ledger_from_secrets()
+        for job_id, (team, actions), (receivers, _, _) in zip(job_ids, assignments.items(), items):
+            ledger.record(job_id, actions, team, receivers, deadline, kind="digest")
+    return dict(zip(job_ids, labels))
+
+# ===================
+# INSIGHT METRICS
+# ===================
+DATA_PATH = st.secrets.get("DATA_PATH", "data/transactions.xlsx")
+DAILY_DIR = st.secrets.get("DAILY_DIR", "data/daily")
+
+@st.cache_resource(max_entries=1, show_spinner="Updating aggregates...")
+def load_aggregates(path, fingerprint, daily_dir, daily):
+    # A new daily drop only reads that file and merges it into the saved
+    # state; the history is reread only when it changes
+    from aggregates import refresh as refresh_aggregates
+
+    return refresh_aggregates(path, daily_dir)
+
+@st.cache_resource(max_entries=1, show_spinner="Building the insight cube...")
+def load_cube(path, fingerprint, daily_dir, daily):
+    # One read-only cube for the current data version, shared by the cards and
+    # any session that queries it; a new daily drop replaces the old one
+    from cube import Cube
+
+    return Cube(load_aggregates(path, fingerprint, daily_dir, daily))
+
+@st.cache_data(show_spinner="Computing insights...")
+def load_metrics(path, fingerprint, daily_dir, daily):
+    # The fingerprints are only part of the cache key: a changed history file
+    # or a newly dropped daily file gets a new entry
+    if fingerprint is None and not daily:
+        return DEFAULT_METRICS
+    from insights import compute_metrics
+
+    return compute_metrics(
+        load_aggregates(path, fingerprint, daily_dir, daily), load_cube(path, fingerprint, daily_dir, daily)
+    )
+
+@st.cache_data(show_spinner="Scanning returns...")
+def load_return_spikes(path, fingerprint, daily_dir, daily):
+    if fingerprint is None and not daily:
+        return []
+    from return_spikes import refresh as refresh_return_spikes
+
+    return refresh_return_spikes(path, daily_dir)
+
+with timed("insights"):
+    metrics = load_metrics(DATA_PATH, fingerprint(DATA_PATH), DAILY_DIR, daily_fingerprint(DAILY_DIR))
+    return_spikes = load_return_spikes(DATA_PATH, fingerprint(DATA_PATH), DAILY_DIR, daily_fingerprint(DAILY_DIR))
+    if spike_days_text(return_spikes):
+        # Detected spikes replace the day-of-month ranking in the returns card
+        metrics = {**metrics, "return_spike_days": spike_days_text(return_spikes)}
 
 # ===================
-# ACTION MODULES AND COLORS
+# ACTION CATALOG
 # ===================
-action_modules = {
-    "Based On Quantitative Analysis": [
-        "✦ Immediate Next Action by Purchase Quantity",
-        "✦ Immediate Next Action by Weight",
-        "✦ Immediate Next Action by Making Charges",
-        "✦ Immediate Next Action Based On Stone Value"
-    ],
-    "Based On Qualitative Analysis": [
-        "✦ Immediate Next Action For Each Brand",
-        "✦ Immediate Next Action from Daily Discount Insights"
-    ],
-    "Based On Multivariate Analysis": [
-        "✦ Maximize Revenue from High Value Buyers",
-        "✦ Optimize Discount Strategy to Protect Margin & Luxury Perception"
-    ],
-    "Based On Time Series Analysis": [
-        "✦ Reducing Returns & Key Focus Areas",
-        "✦ Immediate Next Action - Saturday Sales Push"
-    ]
-}
-
-card_colors = [
-    "linear-gradient(90deg, #BF82D9, #9333EA)", 
-    "linear-gradient(135deg, #f87171, #ef4444)",
-    "linear-gradient(90deg, #F6BB4D, #F59E0B)",  
-    "linear-gradient(90deg, #85B4D4, #3B82F6)"   
-]
-
-example_actions = {
-    '✦ Immediate Next Action by Purchase Quantity': [
-        "✦ Instead of discounting core items, we can offer “Buy any gold or diamond piece and get 15 to 20% off on studs, pendants, or chains.”",
-        "✦ We can cross sell with deals like “Buy this necklace, get 15% off matching bangles.”",
-        "✦ This will increase the quantity of jewelry they purchase as well as the total bill value."
-    ],
-    '✦ Immediate Next Action by Weight': [
-       "✦ Currently, Heavy (10–20g) and Very Heavy (>20g) jewelry get the highest discounts at 6.7%, while Medium (5–10g) averages 6.2%.",
-       "✦ Shifting Medium to 6.5% and trimming Heavy/Very Heavy to 6.3% makes Medium the clear “best value,” creating a decoy effect that nudges Light/Very Light buyers (5.5–6.0%) to upgrade and positions Medium as the smartest choice."
-    ],
-    "✦ Immediate Next Action by Making Charges" : [
-        "✦ In our data, 835 items had Making Charges above ₹50,000. By introducing a Good, Better, & Best choice with ₹3.0L with ₹52k MC, ₹3.3L with ₹65k MC and ₹4.0L with ₹85k MC, customers are naturally nudged toward the middle or premium option. Even if 30% move to “Better” and 10% to “Best,” this simple decoy pricing approach can unlock nearly ₹50L additional revenue without increasing discounts, purely by guiding customers toward designs with higher Making Charges.",
-        "✦ No single bill should get more than ₹1,00,000 discount. In past data, 142 bills crossed ₹1,00,000 in discounts. These very deep cuts directly eat into profit. A hard cap stops uncontrolled losses.",
-        "✦ We can test it for 2 weeks and review it. This short trial makes sure it doesn’t hurt overall sales while protecting profit. After 2 weeks, stakeholders can measure and adjust it."
-    ],
-    "✦ Immediate Next Action Based On Stone Value" : [
-        "✦ DIA and GIS are our mid range stone categories, and together they account for 6,281 transactions with average stone values between ₹25,000 and ₹50,000. That’s nearly 2/3 of all our sales. This means even a small adjustment in how we manage discounts here by just 2–3% can have the biggest impact on our overall margins. So, this segment needs careful control on discounts, supported by value added offers like vouchers.",
-        "✦ For discounts above ₹50,000, we can split it. For example we can give ₹30,000 off now + ₹20,000 shopping voucher for the next purchase. In past data, 371 bills had discounts over ₹50,000. If part of it is a voucher, customers must come back, which boosts future sales and reduces instant profit loss."
-    ],
-    
-    "✦ Immediate Next Action For Each Brand" : [
-        "✦ ZOYA – Achieved ₹2.25 Cr sales from just 43 orders but with an extremely high average discount of ₹69k. This risks diluting luxury positioning so shift from heavy discounts to exclusivity perks like private previews and customization.",
-        "✦ TANISHQ – Delivered ₹92.9 Cr sales from 8203 orders with avg discount of ₹10.6k, but 349 returns hurt margins. Focus on reducing returns through better sizing guidance, quality checks, and clearer product info.",
-        "✦ MIA – ₹5.1 Cr sales from 1652 orders with an average discount of just ₹2.5k shows that customers like the brand at mid-level pricing. But with 68 returns, there’s a gap between what customers expect and what they actually receive. To fix this, MIA should improve product descriptions, images, and try-on/AR options so buyers feel more confident before purchasing, which will reduce returns and increase trust.",
-        "✦ ECOM – ₹45 L sales from 102 orders, zero returns, avg discount just ₹195 shows stable performance. We need to expand reach with stronger digital marketing and targeted acquisition."
-    ],
-        "✦ Immediate Next Action from Daily Discount Insights" : [
-        """✦ Observation:
-            During the 'The Festival of Diamonds' campaign, customers were willing to make big purchases, but their buying decisions were driven mainly by substantial discounts, typically between ₹15k and ₹23k. This group is both aspirational and price-conscious, they desire luxury items, but only when it feels like they are getting a great deal.""",
-        """✦ Why It Matters:
-            If we continue to throw raw discounts at them, we’ll train them to wait only for mega sales.
-            Instead, if we flip their psychology and make them feel like special members and not bargain hunters, they’ll shop even without big discounts, stick with us, spend more on premium pieces, stay engaged, and recommend us to others."""
-    ],
-    "✦ Maximize Revenue from High Value Buyers" : [
-        "✦ Experiences create stronger memories than money saved. A ₹50k discount is forgotten but a luxury photoshoot becomes a story they tell. For customers spending ₹5L+, replace the ₹50k discount with a professional couple’s photoshoot (worth ₹50k) featuring their new jewelry. This costs the same to us, but delivers 2x perceived value, boosts social sharing, and can generate 3 to 5 organic referrals per customer.",
-        "✦ People hate missing out more than they love getting a deal, so when luxury is offered for a limited time, the urgency feels real and natural. Tanishq can run a “Design of the Week”, a necklace or earring sold only for 5 days and then retire it, creating urgency that pushes faster buying decisions and can lift sales by 10-15%, especially around occasions like Akshaya Tritiya."
-    ],
-    "✦ Optimize Discount Strategy to Protect Margin & Luxury Perception" : [
-        "✦ Zoya's discounts are way higher than than Tanishq and Mia. In South 3 it even hits 12.18%. We should pull this back closer to 8% which saves margin and keeps the luxury image intact.",
-        "✦ Ecom is giving 11.3% discounts, almost twice the stores. It is better to run short flash sales under 8% which keeps urgency alive without making customers expect big cuts every time."
-    ],
-    "✦ Reducing Returns & Key Focus Areas" : [
-        "✦ Out of 420 returns, about 170 (40%) are diamonds. If we double check stone quality and size before shipping, we can avoid at least 40 returns every month, saving around ₹25–30 lakh.",
-        "✦ Returns shoot up on sale days that trigger the most returns. On the 13th (22 returns), 25th (27), and 30th (31), returns spiked due to offers. If we fix the products and offers on those days, we can cut around 50 returns monthly, worth ₹35–40 lakh.",
-        "✦ Tanishq is a major source of returns: 118 out of 420 (28%) come from Tanishq, mainly diamonds and GIS. If we make customers try these in-store before buying, we can cut 40–45 returns a month, saving ₹25–30 lakh."
-    ],
-    "✦ Immediate Next Action - Saturday Sales Push" : [
-        "✦ Weekends run at 5.94% average discount vs 5.57% on weekdays, but with fewer transactions (3,356 vs 6,182). If we balance weekend offers better, we can lift sales by 10–12% without cutting margins.",
-        "✦ Monday (6.40%) and Thursday (6.36%) have the steepest discounts but not the highest sales (1,055 and 1,506 txns). Trimming just 0.5% discount here saves ₹15–20 lakh monthly without hurting volumes.",    
-        "✦ Sunday is at 1,947 sales with 6.03% discount, while Saturday is only 1,409 at 5.84%. That’s 40% more sales on Sunday for just 0.2% higher discount. Pushing offers and campaigns on Saturday can add ~500 sales weekly without extra discount."
-    ]
-}
+CATALOG_PATH = st.secrets.get("CATALOG_PATH", "catalog.json")
+PAGE_SIZE = 10
+
+@st.cache_resource
+def load_catalog(path, fingerprint, spike_cards=None):
+    # Parsed and indexed once per catalog file version and set of detected
+    # return spikes, shared by all sessions
+    return Catalog.from_file(path, extra_modules=[spike_cards])
+
+catalog = load_catalog(CATALOG_PATH, fingerprint(CATALOG_PATH), spike_module(return_spikes))
 
 def get_next_actions(action):
-    return example_actions.get(action, [
-        "Define next actions to be taken for this item.",
-        "Assign tasks to appropriate team members."
-    ])
+    templates = catalog.bullets(action)
+    if templates is None:
+        return [
+            "Define next actions to be taken for this item.",
+            "Assign tasks to appropriate team members."
+        ]
+    return render_bullets(templates, metrics)
 
 teams_list = ["Sales", "Marketing", "Finance", "Operations", "Support"]
 
-# === Custom Styling ===
-st.markdown("""
-<style>
-/* Background */
-.stApp {
-    background: linear-gradient(145deg, #1f1f2e, #12121a);
-    color: #f1f1f1;
-    font-family: "Inter", sans-serif;
-}
-
-/* Section Header */
-h2, .section-header {
-    font-size: 1.5rem;
-    font-weight: 700;
-    margin: 2rem 0 1rem 0;
-    padding-bottom: 0.4rem;
-    border-bottom: 2px solid #f6bb4d;
-    color: #f6bb4d !important;
-}
-
-/* Cards */
-.custom-card {
-    transition: all 0.3s ease-in-out;
-    padding: 1.2em;
-    border-radius: 1.2em;
-    font-size: 1em;
-    font-weight: 600;
-    text-align: center;
-    color: #fff;
-    margin-bottom: 1em;
-    background: rgba(255, 255, 255, 0.07);
-    backdrop-filter: blur(8px);
-    border: 1px solid rgba(255, 255, 255, 0.15);
-    box-shadow: 0 8px 20px rgba(0,0,0,0.3);
-}
-.custom-card:hover {
-    transform: translateY(-5px) scale(1.02);
-    box-shadow: 0 12px 30px rgba(0,0,0,0.4);
-}
-
-/* Global Buttons */
-.stButton > button {
-    background: linear-gradient(135deg, #6e8efb, #a777e3);
-    border: none;
-    color: white !important;
-    font-weight: 600;
-    padding: 0.6rem 1.2rem;
-    border-radius: 0.8rem;
-    transition: all 0.3s ease;
-    cursor: pointer;
-}
-.stButton > button:hover {
-    transform: scale(1.05);
-    background: linear-gradient(135deg, #a777e3, #6e8efb);
-    box-shadow: 0px 4px 15px rgba(0,0,0,0.25);
-}
-
-/* Popover Styling */
-[data-testid="stPopover"] {
-    background: rgba(30, 30, 46, 0.85) !important;
-    backdrop-filter: blur(10px);
-    border-radius: 1rem !important;
-    border: 1px solid rgba(255, 255, 255, 0.15);
-    box-shadow: 0px 8px 25px rgba(0,0,0,0.4);
-    padding: 1.2rem !important;
-    color: white !important;
-}
-[data-testid="stPopover"] h4, 
-[data-testid="stPopover"] h3, 
-[data-testid="stPopover"] h2 {
-    color: #f6bb4d !important;
-    font-weight: 700;
-}
-
-/* Next Actions Heading */
-.next-actions-heading {
-    font-size: 1.2rem;
-    font-weight: 700;
-    color: #f6bb4d !important;
-    border-bottom: 2px solid #f6bb4d;
-    padding-bottom: 0.3rem;
-    margin-bottom: 1rem;
-}
-</style>
-""", unsafe_allow_html=True)
+
+# === High Value Buyers ===
+HIGH_VALUE_CARD = "✦ Maximize Revenue from High Value Buyers"
+
+@st.cache_data(show_spinner="Segmenting customers...")
+def load_customer_segments(path, fingerprint):
+    # Only the summary is cached here; members stay in the segment artifact.
+    # First loaded when the High Value card opens, not on every cold start
+    if fingerprint is None:
+        return None
+    from segments import refresh as refresh_segments
+
+    return refresh_segments(path)
+
+@st.cache_data(max_entries=4)
+def high_value_target_list(path, fingerprint):
+    from segments import HIGH_VALUE_TIER, load_members
+
+    return load_members(spend_tier=HIGH_VALUE_TIER).to_csv(index=False).encode("utf-8")
+
+def render_high_value_buyers():
+    from segments import HIGH_VALUE_TIER
+
+    customer_segments = load_customer_segments(DATA_PATH, fingerprint(DATA_PATH))
+    if customer_segments is None:
+        st.caption("Customer counts need a customer_id column in the transaction data.")
+        return
+    high_value = customer_segments["high_value"]
+    c1, c2 = st.columns(2)
+    c1.metric(f"{HIGH_VALUE_TIER} buyers", f"{high_value['customers']:,}")
+    c2.metric("Share of net spend", f"{high_value['spend_share']:.0%}")
+    st.dataframe(
+        {
+            "Segment": list(high_value["segments"]),
+            "Customers": list(high_value["segments"].values()),
+        },
+        hide_index=True,
+        use_container_width=True
+    )
+    st.download_button(
+        "Download target list",
+        high_value_target_list(DATA_PATH, fingerprint(DATA_PATH)),
+        file_name=f"high_value_buyers_{customer_segments['as_of']}.csv",
+        mime="text/csv",
+        key="high_value_export"
+    )
+    st.caption(f"Customers with {HIGH_VALUE_TIER} net spend up to {customer_segments['as_of']}.")
 
 # === Display Cards ===
-for idx, (module_name, actions) in enumerate(action_modules.items()):
-    colored_header(module_name, "Key Recommendations", color_name="orange-70")
-    cols = st.columns(2)
-    for col, action in zip(cols * ((len(actions) + 1) // 2), actions):
-        with col:
-            color = card_colors[idx % len(card_colors)]
-            st.markdown(
-                f"""
-                <div class="custom-card" style="background:{color};">
-                    <b>{action}</b>
-                </div>
-                """,
-                unsafe_allow_html=True
+# Each card is a fragment: "See Details" and "Cancel" rerun only that card,
+# not the header, CSS and every other card on the page
+def close_popup(popup_key):
+    # Runs before the fragment reruns, so the popover is already gone when it renders
+    st.session_state[f"show_{popup_key}"] = False
+
+@fragment
+def render_action_card(module_name, action, color):
+    st.markdown(
+        f"""
+        <div class="custom-card" style="background:{color};">
+            <b>{action}</b>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+    popup_key = f"popup_{module_name}_{action}"
+    if st.button("See Details", key=popup_key):
+        current = st.session_state.get(f"show_{popup_key}", False)
+        st.session_state[f"show_{popup_key}"] = not current
+    if st.session_state.get(f"show_{popup_key}", False):
+        with st.popover("Next Actions To Be Taken"), timed("popover"):
+            st.markdown('<div class="next-actions-heading">Next Actions to Be Taken</div>', unsafe_allow_html=True)
+            bullets = get_next_actions(action)
+            for bullet in bullets:
+                st.markdown(
+                    f"""
+                    <div class="custom-card" style="background:linear-gradient(90deg,#BF82D9,#9333EA); text-align:left; font-size:0.95em;">
+                        {bullet}
+                    </div>
+                    """,
+                    unsafe_allow_html=True
+                )
+            if action == HIGH_VALUE_CARD:
+                render_high_value_buyers()
+            st.markdown("---")
+            action_text = st.text_area(
+                "Add further specific instructions or planned steps:",
+                placeholder="E.g. Assign tasks, request weekly update, etc.",
+                height=120,
+                key=f"action_text_{popup_key}"
+            )
+            selected_team = st.selectbox(
+                "Select Team to Assign",
+                teams_list,
+                key=f"team_select_{popup_key}"
             )
-            popup_key = f"popup_{module_name}_{action}"
-            if st.button("See Details", key=popup_key):
-                current = st.session_state.get(f"show_{popup_key}", False)
-                st.session_state[f"show_{popup_key}"] = not current
-            if st.session_state.get(f"show_{popup_key}", False):
-                with st.popover("Next Actions To Be Taken"):
-                    st.markdown('<div class="next-actions-heading">Next Actions to Be Taken</div>', unsafe_allow_html=True)
-                    bullets = get_next_actions(action)
-                    for bullet in bullets:
-                        st.markdown(
-                            f"""
-                            <div class="custom-card" style="background:linear-gradient(90deg,#BF82D9,#9333EA); text-align:left; font-size:0.95em;">
-                                {bullet}
-                            </div>
-                            """,
-                            unsafe_allow_html=True
-                        )
-                    st.markdown("---")
-                    action_text = st.text_area(
-                        "Add further specific instructions or planned steps:",
-                        placeholder="E.g. Assign tasks, request weekly update, etc.",
-                        height=120,
-                        key=f"action_text_{popup_key}"
-                    )
-                    selected_team = st.selectbox(
-                        "Select Team to Assign",
-                        teams_list,
-                        key=f"team_select_{popup_key}"
-                    )
-                    c1, c2 = st.columns([1,1])
-                    with c1:
-                        send_pressed = st.button("Send Action", key=f"send_action_{popup_key}", use_container_width=True)
-                    with c2:
-                        cancel_pressed = st.button("Cancel", key=f"cancel_action_{popup_key}", use_container_width=True)
-                    if send_pressed:
-                        st.session_state[f"show_{popup_key}"] = False
-                        next_steps = "\n".join(bullets)
-                        personalized_msg = f"NEXT ACTIONS:\n{next_steps}\n\nOTHER INSTRUCTIONS:\n{action_text}"
-                        success = send_assignment_email(action, selected_team, datetime.date.today(), personalized_msg)
-                        if success:
-                            st.session_state["assignment_status"] = f"✅ Immediate action sent for '{action}'."
-                        else:
-                            st.session_state["assignment_status"] = f"⚠️ Failed to send the immediate action for '{action}'. Check your configuration."
-                        st.rerun()
-                    if cancel_pressed:
-                        st.session_state[f"show_{popup_key}"] = False
-                        st.rerun()
+            c1, c2 = st.columns([1,1])
+            with c1:
+                send_pressed = st.button("Send Action", key=f"send_action_{popup_key}", use_container_width=True)
+            with c2:
+                st.button("Cancel", key=f"cancel_action_{popup_key}", use_container_width=True,
+                          on_click=close_popup, args=(popup_key,))
+            if send_pressed:
+                st.session_state[f"show_{popup_key}"] = False
+                next_steps = "\n".join(bullets)
+                personalized_msg = f"NEXT ACTIONS:\n{next_steps}\n\nOTHER INSTRUCTIONS:\n{action_text}"
+                job_id = send_assignment_email(action, selected_team, datetime.date.today(), personalized_msg)
+                if job_id:
+                    st.session_state.setdefault("email_jobs", {})[job_id] = f"the immediate action for '{action}'"
+                else:
+                    st.session_state["assignment_status"] = f"⚠️ Failed to send the immediate action for '{action}'. Check your configuration."
+                # Full rerun so the page-level status below starts polling the outbox
+                st.rerun()
+
+def reset_page():
+    st.session_state["catalog_page"] = 1
+
+def change_page(step):
+    st.session_state["catalog_page"] = st.session_state.get("catalog_page", 1) + step
+
+with timed("card_grid"):
+    from streamlit_extras.colored_header import colored_header
+
+    c1, c2 = st.columns([3, 2])
+    with c1:
+        query = st.text_input(
+            "Search actions",
+            placeholder="E.g. returns, Zoya, Saturday...",
+            key="catalog_query",
+            on_change=reset_page
+        )
+    with c2:
+        sections = st.multiselect("Sections", catalog.modules, key="catalog_sections", on_change=reset_page)
+
+    # Only the current page's cards are rendered, so widgets and render time
+    # depend on PAGE_SIZE rather than on the size of the catalog
+    matches = catalog.search(query, sections)
+    page_count = max(1, -(-len(matches) // PAGE_SIZE))
+    page = min(max(st.session_state.get("catalog_page", 1), 1), page_count)
+    st.session_state["catalog_page"] = page
+    visible = matches[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+
+    if not matches:
+        st.info("No actions match your search.")
+
+    for module_idx in sorted({catalog.actions[i][0] for i in visible}):
+        module_name = catalog.modules[module_idx]
+        actions = [catalog.actions[i][1] for i in visible if catalog.actions[i][0] == module_idx]
+        colored_header(module_name, "Key Recommendations", color_name="orange-70")
+        cols = st.columns(2)
+        for col, action in zip(cols * ((len(actions) + 1) // 2), actions):
+            with col:
+                render_action_card(module_name, action, catalog.color(module_idx))
+
+    if page_count > 1:
+        c1, c2, c3 = st.columns([1, 2, 1])
+        with c1:
+            st.button("◀ Previous", key="catalog_prev", disabled=page <= 1, on_click=change_page, args=(-1,))
+        with c2:
+            st.caption(f"Page {page} of {page_count} · {len(matches)} actions")
+        with c3:
+            st.button("Next ▶", key="catalog_next", disabled=page >= page_count, on_click=change_page, args=(1,))
+
+# === Bulk Assignment ===
+# Many actions mapped to many teams, sent as one digest email per team
+@fragment
+def render_bulk_assign():
+    with st.expander("📦 Bulk assign actions to teams"):
+        titles = [title for _, title in catalog.actions]
+        selected = st.multiselect("Actions", titles, key="bulk_actions")
+        teams = st.multiselect("Teams", teams_list, key="bulk_teams")
+        if not selected or not teams:
+            st.caption("Pick actions and teams, then tick which team gets which action.")
+            return
+        # One row per action, one checkbox column per team
+        mapping = st.data_editor(
+            {"Action": selected, **{team: [True] * len(selected) for team in teams}},
+            disabled=["Action"],
+            hide_index=True,
+            use_container_width=True,
+            key=f"bulk_mapping_{hash((tuple(selected), tuple(teams)))}"
+        )
+        deadline = st.date_input("Deadline", value=datetime.date.today(), key="bulk_deadline")
+        note = st.text_area("Instructions for every team:", height=80, key="bulk_note")
+        assignments = {
+            team: [action for action, ticked in zip(mapping["Action"], mapping[team]) if ticked]
+            for team in teams
+        }
+        assignments = {team: actions for team, actions in assignments.items() if actions}
+        total = sum(len(actions) for actions in assignments.values())
+        if st.button(f"Send {len(assignments)} digest(s) for {total} assignment(s)", key="bulk_send",
+                     disabled=not assignments, use_container_width=True):
+            jobs = send_team_digests(assignments, deadline, note)
+            if jobs:
+                st.session_state.setdefault("email_jobs", {}).update(jobs)
+                st.rerun()
+
+render_bulk_assign()
+
+# === Assignment Ledger ===
+def complete_assignment(open_rows):
+    # Runs before the fragment reruns, so the tables already leave it out
+    row = open_rows[st.session_state["ledger_complete_select"]]
+    ledger = get_ledger_from_secrets()
+    ledger.complete(row["action"], row["team"], row["deadline"])
+    ledger.flush()
+    st.session_state["ledger_complete_select"] = None
+
+@fragment
+def render_ledger():
+    with st.expander("📒 Assignment ledger"):
+        ledger = get_ledger_from_secrets()
+        c1, c2 = st.columns([2, 3])
+        with c1:
+            st.markdown("**Open assignments per team**")
+            st.dataframe(ledger.open_per_team(), hide_index=True, use_container_width=True)
+        with c2:
+            st.markdown("**Sent this week**")
+            st.dataframe(ledger.sent_this_week(), hide_index=True, use_container_width=True)
+        open_rows = ledger.open_assignments()
+        c1, c2 = st.columns([4, 1])
+        with c1:
+            done = st.selectbox(
+                "Mark an assignment completed",
+                range(len(open_rows)),
+                index=None,
+                format_func=lambda i: f"{open_rows[i]['action']} – {open_rows[i]['team']} (due {open_rows[i]['deadline']})",
+                key="ledger_complete_select"
+            )
+        with c2:
+            st.button("Complete", key="ledger_complete", disabled=done is None, use_container_width=True,
+                      on_click=complete_assignment, args=(open_rows,))
+        st.button("Refresh", key="ledger_refresh")
+
+render_ledger()
+
+# === Decoy Pricing Simulator ===
+@st.cache_data
+def load_high_mc_items(path, fingerprint):
+    from decoy_pricing import HIGH_MC_THRESHOLD, assumed_items
+
+    if fingerprint is None:
+        return assumed_items()
+    from data_store import IS_RETURN, MAKING_CHARGES, load_frame
+
+    df = load_frame(path, columns=[MAKING_CHARGES, IS_RETURN])
+    making_charges = df.loc[~df[IS_RETURN], MAKING_CHARGES].to_numpy()
+    return making_charges[making_charges > HIGH_MC_THRESHOLD]
+
+@st.cache_data(max_entries=256)
+def run_decoy_simulation(path, fingerprint, better_rate, best_rate, tiers, n_scenarios, concentration):
+    from decoy_pricing import simulate_uplift, summarize as summarize_uplift
+
+    items = load_high_mc_items(path, fingerprint)
+    uplift = simulate_uplift(items, better_rate, best_rate, tiers, n_scenarios, concentration)
+    return len(items), summarize_uplift(uplift)
+
+@fragment
+def render_decoy_simulator():
+    from decoy_pricing import DEFAULT_TIERS
+
+    with st.expander("🎯 Good / Better / Best decoy pricing simulator"):
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            better_rate = st.slider("Move to Better (%)", 0, 100, 30, key="decoy_better") / 100
+            good_mc = st.number_input("Good MC (₹)", value=DEFAULT_TIERS[0], step=1000, key="decoy_good_mc")
+        with c2:
+            best_rate = st.slider("Move to Best (%)", 0, 100, 10, key="decoy_best") / 100
+            better_mc = st.number_input("Better MC (₹)", value=DEFAULT_TIERS[1], step=1000, key="decoy_better_mc")
+        with c3:
+            certainty = st.slider("Certainty of the rates", 5, 500, 50, key="decoy_certainty")
+            best_mc = st.number_input("Best MC (₹)", value=DEFAULT_TIERS[2], step=1000, key="decoy_best_mc")
+        if better_rate + best_rate > 1:
+            st.warning("Better and Best together cannot exceed 100%.")
+            return
+        if good_mc <= 0:
+            st.warning("Good MC must be above zero.")
+            return
+
+        n_items, result = run_decoy_simulation(
+            DATA_PATH, fingerprint(DATA_PATH), better_rate, best_rate,
+            (good_mc, better_mc, best_mc), 5000, float(certainty)
+        )
+        st.caption(f"5,000 scenarios over {n_items:,} items with Making Charges above ₹50,000.")
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Expected uplift", fmt_inr(result["mean"]))
+        m2.metric("Pessimistic (P5)", fmt_inr(result["p5"]))
+        m3.metric("Optimistic (P95)", fmt_inr(result["p95"]))
+        edges = result["edges"]
+        st.bar_chart(
+            {
+                "Uplift (₹ lakh)": [round((lo + hi) / 2 / 1e5, 1) for lo, hi in zip(edges[:-1], edges[1:])],
+                "Scenarios": result["counts"].tolist(),
+            },
+            x="Uplift (₹ lakh)",
+            y="Scenarios"
+        )
+
+render_decoy_simulator()
+
+# === Discount Policy What-If ===
+POLICY_CAPS = [25_000, 50_000, 75_000, 100_000, 150_000, 200_000]
+POLICY_SPLITS = [20_000, 30_000, 50_000, 75_000, 100_000]
+
+@st.cache_resource(max_entries=1)
+def load_policy_frame(path, fingerprint):
+    # Shared read-only across sessions; the engine never mutates it. Only the
+    # current data version is kept
+    from data_store import load_frame
+    from policy_engine import COLUMNS
+
+    return load_frame(path, columns=COLUMNS)
+
+@st.cache_resource(max_entries=8)
+def prepare_policy_data(path, fingerprint, brand, region):
+    # One set of bill arrays per brand/region scope; the least recently used
+    # scopes are dropped
+    from policy_engine import prepare
+
+    return prepare(load_policy_frame(path, fingerprint), brand=brand, region=region)
+
+@st.cache_data(max_entries=64)
+def run_policy_grid(path, fingerprint, brand, region, caps, splits, rates, redemption):
+    from policy_engine import evaluate_grid
+
+    data = prepare_policy_data(path, fingerprint, brand, region)
+    return evaluate_grid(data, caps, splits, rates, redemption)
+
+@fragment
+def render_policy_whatif():
+    with st.expander("🧮 Discount policy what-if"):
+        data_version = fingerprint(DATA_PATH)
+        if data_version is None:
+            st.info("Replaying policies needs the transaction data. Set DATA_PATH in your secrets.")
+            return
+        import numpy as np
+        from data_store import BRAND, REGION
+
+        df = load_policy_frame(DATA_PATH, data_version)
+
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            brand = st.selectbox("Target rate applies to brand", ["All brands", *map(str, df[BRAND].unique())], key="policy_brand")
+            rate_range = st.slider("Target discount rates (%)", 0.0, 20.0, (6.0, 12.0), step=0.5, key="policy_rates")
+        with c2:
+            region = st.selectbox("...and region", ["All regions", *map(str, df[REGION].unique())], key="policy_region")
+            caps = st.multiselect("Bill discount caps (₹)", POLICY_CAPS, default=[100_000], key="policy_caps")
+        with c3:
+            redemption = st.slider("Voucher redemption (%)", 0, 100, 50, key="policy_redemption") / 100
+            splits = st.multiselect("Cash + voucher split above (₹)", POLICY_SPLITS, default=[50_000], key="policy_splits")
+
+        rates = [None] + list(np.arange(rate_range[0], rate_range[1] + 0.25, 0.5).round(2))
+        caps = [*caps, np.inf]
+        splits = [*splits, np.inf]
+        results = run_policy_grid(
+            DATA_PATH, data_version,
+            None if brand == "All brands" else brand,
+            None if region == "All regions" else region,
+            tuple(caps), tuple(splits), tuple(rates), redemption
+        )
+        st.caption(f"{len(results):,} policies replayed over the full bill history.")
+        top = results.sort_values("margin_saved", ascending=False).head(15)
+        st.dataframe(
+            {
+                "Target rate": [("—" if np.isnan(r) else f"{r:.1f}%") for r in top["target_rate"]],
+                "Bill cap": [("—" if np.isinf(c) else fmt_inr(c)) for c in top["cap"]],
+                "Split above": [("—" if np.isinf(x) else fmt_inr(x)) for x in top["split"]],
+                "Margin saved": [fmt_inr(v) for v in top["margin_saved"]],
+                "Bills affected": [f"{int(n):,}" for n in top["bills_affected"]],
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+
+render_policy_whatif()
+
+# Poll the outbox for this session's queued emails; once all are settled,
+# rerun the page so the confirmation below is shown
+def show_email_jobs():
+    jobs = st.session_state.get("email_jobs", {})
+    outbox = get_outbox_from_secrets()
+    messages = []
+    for job_id, label in list(jobs.items()):
+        job = outbox.status(job_id)
+        state = job["state"] if job else FAILED
+        if state == SENT:
+            messages.append(f"✅ Sent {label}.")
+        elif state == FAILED:
+            messages.append(f"⚠️ Failed to send {label}. Check your configuration.")
+        else:
+            st.info(f"📨 Sending {label}...")
+            continue
+        del jobs[job_id]
+    if messages:
+        st.session_state["assignment_status"] = "\n\n".join(messages)
+    if not jobs:
+        st.rerun()
+
+if st.session_state.get("email_jobs"):
+    fragment(show_email_jobs, run_every=1)()
 
 # Show confirmation messages outside popups
 if "assignment_status" in st.session_state:
@@ -364,49 +764,6 @@ if "assignment_status" in st.session_state:
 # Reference Link
 st.markdown(
     """
-    <style>
-    .header-container {
-        display: flex;
-        justify-content: flex-end;  /* Align only to right */
-        margin-top: 8px;
-        margin-bottom: 15px;
-    }
-    .yellow-line {
-        border: none;
-        border-top: 3px solid #FFD700; /* Yellow line */
-        margin: 15px 0;
-    }
-    .dashboard-link {
-        display: block;
-        padding: 14px 22px;
-        border-radius: 12px;
-        text-align: center;
-        font-size: 16px;
-        font-weight: 600;
-        color: white !important;
-        background: linear-gradient(90deg, #BF82D9, #9333EA);
-        text-decoration: none !important;
-        box-shadow: 0 8px 20px rgba(0,0,0,0.25), 
-                    inset 0 1px 6px rgba(255,255,255,0.2);
-        transition: all 0.3s ease;
-    }
-    .dashboard-link:hover {
-        transform: translateY(-4px) scale(1.02);
-        box-shadow: 0 12px 28px rgba(0,0,0,0.35), 
-                    inset 0 1px 8px rgba(255,255,255,0.25);
-        text-decoration: none !important;
-        color: white !important;
-    }
-    .dashboard-link span {
-        display: block;
-        font-size: 13px;
-        font-weight: 400;
-        margin-top: 4px;
-        opacity: 0.9;  
-        color: white !important;
-    }
-    </style>
-
     <!-- Yellow line under title -->
     <hr class="yellow-line">
 
@@ -420,11 +777,73 @@ st.markdown(
     unsafe_allow_html=True
 )
 
+# === Performance Panel ===
+@fragment
+def render_performance_panel():
+    with st.expander("⏱ Performance"):
+        snapshot = telemetry.snapshot()
+        runs = int(snapshot["counters"].get("script_runs_total", 0))
+        st.caption(f"{runs:,} script runs across {snapshot['sessions']:,} sessions since "
+                   f"{datetime.datetime.fromtimestamp(telemetry.started):%d %b %H:%M}.")
+        timers = snapshot["histograms"]
+        if timers:
+            st.dataframe(
+                {
+                    "Timer": list(timers),
+                    "Count": [t["count"] for t in timers.values()],
+                    "Mean (ms)": [round(t["mean"] * 1000, 1) for t in timers.values()],
+                    "p50 ≤ (ms)": [t["p50"] * 1000 for t in timers.values()],
+                    "p95 ≤ (ms)": [t["p95"] * 1000 for t in timers.values()],
+                    "p99 ≤ (ms)": [t["p99"] * 1000 for t in timers.values()],
+                },
+                hide_index=True,
+                use_container_width=True
+            )
+        counters = {name: value for name, value in snapshot["counters"].items() if name != "script_runs_total"}
+        if counters:
+            st.dataframe({"Counter": list(counters), "Value": list(counters.values())}, hide_index=True)
+
+        from data_store import LOAD_REPORTS
+
+        loads = list(LOAD_REPORTS)[::-1]
+        if loads:
+            st.markdown("**Data loads**")
+            st.dataframe(
+                {
+                    "Loaded at": [r["loaded_at"] for r in loads],
+                    "Source": [os.path.basename(r["source"]) for r in loads],
+                    "Cache": ["cold" if r["cold"] else "cached" for r in loads],
+                    "Seconds": [r["seconds"] for r in loads],
+                    "Rows": [r["rows"] for r in loads],
+                    "RSS (MB)": [r["rss_mb"] for r in loads],
+                    "RSS change (MB)": [r["rss_delta_mb"] for r in loads],
+                },
+                hide_index=True,
+                use_container_width=True
+            )
 
-
-
-
-
-
-
-
+        profiler = get_profiler(secret_flag("PROFILER"))
+        if st.toggle("Sampling profiler", value=profiler.running, key="profiler_on"):
+            profiler.start()
+        else:
+            profiler.stop()
+        if profiler.samples:
+            top = profiler.top(15)
+            st.dataframe(
+                {
+                    "Function": [func for func, _, _ in top],
+                    "Samples": [count for _, count, _ in top],
+                    "Share": [f"{share:.0%}" for _, _, share in top],
+                },
+                hide_index=True,
+                use_container_width=True
+            )
+            c1, c2 = st.columns(2)
+            with c1:
+                st.download_button("Download folded stacks", profiler.folded(), file_name="profile.folded")
+            with c2:
+                st.button("Clear samples", on_click=profiler.clear)
+
+finish_run()
+if telemetry:
+    render_performance_panel()
@@ -0,0 +1,313 @@
+"""Rerun latency and payload benchmarks for app.py.
+
+Drives the app headlessly with Streamlit's AppTest against a local stub SMTP
+server and records, per scenario, the script wall time, the time until the
+first element is sent (first paint), the number of delta messages and the
+serialized ForwardMsg payload size:
+
+    cold_start      first run in a fresh Python process
+    first_render    first run of a new session with warm caches
+    toggle_popover  "See Details" click (reruns only the card fragment)
+    send_action     "Send Action" click, plus time until the stub receives it
+
+Each scenario runs against synthetic catalogs of increasing size. Usage:
+
+    python benchmarks/bench_app.py --sizes 10 100 1000 --repeat 3 --json out.json
+    python benchmarks/bench_app.py --baseline out.json --tolerance 0.25
+
+With ``--baseline`` the run exits with status 1 if any scenario's median
+wall time or payload grew by more than the tolerance.
+"""
+import argparse
+import atexit
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+CATALOG_PATH = None
+LEDGER_PATH = None
+
+SCENARIOS = ["cold_start", "first_render", "toggle_popover", "send_action"]
+TEAMS = ["Sales", "Marketing", "Finance", "Operations", "Support"]  # teams_list in app.py
+
+# (card, team) pairs already sent to in this run; the app's outbox is shared
+# by every sample and drops repeats of an (action, team, date) it has sent
+SENT_PAIRS = set()
+
+
+# ===================
+# SYNTHETIC CATALOGS
+# ===================
+def synthetic_catalog(size):
+    modules = [{"name": f"Synthetic Module {m + 1}", "actions": []} for m in range(4)]
+    for i in range(size):
+        modules[i % len(modules)]["actions"].append({
+            "title": f"✦ Synthetic Action {i + 1:04d}",
+            "bullets": [
+                f"✦ Synthetic insight {i + 1}, bullet {b + 1}: discount {{weekday_discount_pct}} "
+                f"across {{weekday_txns}} transactions."
+                for b in range(3)
+            ],
+        })
+    with open(os.path.join(ROOT, "catalog.json"), encoding="utf-8") as f:
+        colors = json.load(f)["colors"]
+    return {"colors": colors, "modules": modules}
+
+
+def install_catalog(size):
+    global CATALOG_PATH
+    CATALOG_PATH = os.path.join(tempfile.gettempdir(), f"bench_catalog_{size}.json")
+    with open(CATALOG_PATH, "w", encoding="utf-8") as f:
+        json.dump(synthetic_catalog(size), f, ensure_ascii=False)
+
+
+def install_ledger():
+    # Benchmark sends are recorded in a throwaway ledger, never in data/ledger.db
+    global LEDGER_PATH
+    LEDGER_PATH = os.path.join(tempfile.mkdtemp(prefix="bench_ledger_"), "ledger.db")
+    atexit.register(shutil.rmtree, os.path.dirname(LEDGER_PATH), ignore_errors=True)
+
+
+# ===================
+# APPTEST INSTRUMENTATION
+# ===================
+def install_recorder():
+    """Swap AppTest's script runner for one that records its messages.
+
+    The recorder also shares fragment storage across runs and can turn the
+    next rerun request into a fragment-only rerun, which AppTest on its own
+    does not do.
+    """
+    import streamlit.testing.v1.app_test as app_test
+    from streamlit.runtime.fragment import MemoryFragmentStorage
+    from streamlit.runtime.scriptrunner_utils.script_requests import RerunData
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+    class RecordingScriptRunner(LocalScriptRunner):
+        fragment_storage = MemoryFragmentStorage()
+        next_fragment_ids = None
+        last = None
+        first_delta_at = None
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._fragment_storage = RecordingScriptRunner.fragment_storage
+            RecordingScriptRunner.last = self
+            enqueue = self.forward_msg_queue.enqueue
+
+            def timed_enqueue(msg):
+                if RecordingScriptRunner.first_delta_at is None and msg.HasField("delta"):
+                    RecordingScriptRunner.first_delta_at = time.perf_counter()
+                enqueue(msg)
+
+            self.forward_msg_queue.enqueue = timed_enqueue
+
+        def request_rerun(self, rerun_data):
+            fragment_ids, RecordingScriptRunner.next_fragment_ids = RecordingScriptRunner.next_fragment_ids, None
+            if fragment_ids:
+                rerun_data = RerunData(
+                    widget_states=rerun_data.widget_states,
+                    query_string=rerun_data.query_string,
+                    page_script_hash=rerun_data.page_script_hash,
+                    fragment_id_queue=list(fragment_ids),
+                )
+            return super().request_rerun(rerun_data)
+
+    app_test.LocalScriptRunner = RecordingScriptRunner
+    return RecordingScriptRunner
+
+
+def payload(recorder, started):
+    msgs = recorder.last.forward_msgs()
+    return {
+        "paint_seconds": (recorder.first_delta_at or time.perf_counter()) - started,
+        "deltas": sum(1 for m in msgs if m.HasField("delta")),
+        "bytes": sum(m.ByteSize() for m in msgs),
+    }
+
+
+def card_fragment_id(recorder):
+    for m in recorder.last.forward_msgs():
+        if m.HasField("delta") and m.delta.fragment_id and m.delta.WhichOneof("type") == "new_element":
+            element = m.delta.new_element
+            if element.WhichOneof("type") == "button" and element.button.label == "See Details":
+                return m.delta.fragment_id
+    return None
+
+
+def new_app(smtp):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    at.secrets["EMAIL_SENDER"] = "bench@example.com"
+    at.secrets["EMAIL_RECEIVER"] = "team@example.com"
+    at.secrets["EMAIL_PASSWORD"] = ""
+    at.secrets["SMTP_HOST"] = "127.0.0.1"
+    at.secrets["SMTP_PORT"] = smtp.port
+    at.secrets["SMTP_SSL"] = False
+    at.secrets["CATALOG_PATH"] = CATALOG_PATH
+    at.secrets["LEDGER_PATH"] = LEDGER_PATH
+    return at
+
+
+def timed_run(recorder, action):
+    recorder.first_delta_at = None
+    started = time.perf_counter()
+    at = action()
+    sample = {"seconds": time.perf_counter() - started, **payload(recorder, started)}
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return sample
+
+
+# ===================
+# SCENARIOS
+# ===================
+def first_render(recorder, smtp):
+    at = new_app(smtp)
+    return timed_run(recorder, at.run)
+
+
+def toggle_popover(recorder, smtp):
+    at = new_app(smtp).run()
+    recorder.next_fragment_ids = [card_fragment_id(recorder)]
+    return timed_run(recorder, at.button[0].click().run)
+
+
+def send_action(recorder, smtp):
+    at = new_app(smtp).run()
+    unsent = (
+        (button.key, team)
+        for button in at.button if button.key and button.key.startswith("popup_")
+        for team in TEAMS if (button.key, team) not in SENT_PAIRS
+    )
+    popup_key, team = next(unsent, (None, None))
+    if popup_key is None:
+        raise RuntimeError(f"send_action ran out of unsent (card, team) pairs after {len(SENT_PAIRS)} samples")
+    SENT_PAIRS.add((popup_key, team))
+    at.button(key=popup_key).click().run()
+    at.selectbox(key=f"team_select_{popup_key}").set_value(team)
+    send = at.button(key=f"send_action_{popup_key}")
+    delivered = len(smtp.messages)
+    sample = timed_run(recorder, send.click().run)
+
+    started = time.perf_counter()
+    while len(smtp.messages) == delivered and time.perf_counter() - started < 30:
+        time.sleep(0.005)
+    sample["delivery_seconds"] = sample["seconds"] + time.perf_counter() - started
+    return sample
+
+
+def cold_start(size):
+    # A child process, so imports and every cache start empty
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child-cold-start", str(size)],
+        capture_output=True, text=True, check=True, cwd=ROOT,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def child_cold_start(size):
+    from smtp_stub import StubSMTPServer
+
+    started = time.perf_counter()
+    recorder = install_recorder()
+    install_catalog(size)
+    install_ledger()
+    with StubSMTPServer() as smtp:
+        at = new_app(smtp)
+        at.run()
+    print(json.dumps({"seconds": time.perf_counter() - started, **payload(recorder, started)}))
+
+
+# ===================
+# DRIVER
+# ===================
+def summarize(samples):
+    return {
+        key: statistics.median(s[key] for s in samples)
+        for key in samples[0]
+    }
+
+
+def run(sizes, repeat, scenarios):
+    from smtp_stub import StubSMTPServer
+
+    recorder = install_recorder()
+    install_ledger()
+    results = {}
+    with StubSMTPServer() as smtp:
+        for size in sizes:
+            install_catalog(size)
+            for scenario in scenarios:
+                if scenario == "cold_start":
+                    samples = [cold_start(size) for _ in range(repeat)]
+                else:
+                    func = globals()[scenario]
+                    func(recorder, smtp)  # warm-up
+                    samples = [func(recorder, smtp) for _ in range(repeat)]
+                results[f"{scenario}[{size}]"] = summarize(samples)
+                print(format_row(f"{scenario}[{size}]", results[f"{scenario}[{size}]"]), flush=True)
+    return results
+
+
+def format_row(name, result):
+    extra = f"  delivered {result['delivery_seconds'] * 1000:8.1f} ms" if "delivery_seconds" in result else ""
+    return (f"{name:<24} {result['seconds'] * 1000:9.1f} ms  paint {result['paint_seconds'] * 1000:8.1f} ms  "
+            f"{int(result['deltas']):6d} deltas  "
+            f"{result['bytes'] / 1024:9.1f} KiB{extra}")
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key in ("seconds", "paint_seconds", "bytes"):
+            if base.get(key) and result[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name} {key}: {base[key]:.4g} -> {result[key]:.4g}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against results from an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--child-cold-start", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    os.chdir(ROOT)
+    if args.child_cold_start is not None:
+        child_cold_start(args.child_cold_start)
+        return 0
+
+    results = run(args.sizes, args.repeat, args.scenarios)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
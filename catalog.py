@@ -0,0 +1,91 @@
+"""Action catalog: the card sections, their colors and the bullet templates.
+
+The catalog lives in a JSON file (``catalog.json``) and is parsed once per
+file version. Titles and bullets are indexed in an inverted index so search
+only touches the postings of the query terms. Bullets may contain
+``{placeholders}`` that are filled from the insight metrics (see
+``page_helpers.render_bullets``).
+"""
+import bisect
+import json
+import re
+from collections import defaultdict
+
+CATALOG_PATH = "catalog.json"
+
+TOKEN = re.compile(r"\w+")
+PLACEHOLDER = re.compile(r"\{[a-z0-9_]+\}")
+
+
+def tokenize(text):
+    return TOKEN.findall(PLACEHOLDER.sub(" ", text).lower())
+
+
+class Catalog:
+    """In-memory view of a catalog file with a full-text index.
+
+    Actions are addressed by their position in catalog order; ``actions[i]``
+    is a ``(module_index, title)`` pair.
+    """
+
+    def __init__(self, data):
+        self.colors = data["colors"]
+        self.modules = []
+        self.actions = []
+        self._bullets = {}
+        for module_idx, module in enumerate(data["modules"]):
+            self.modules.append(module["name"])
+            for action in module["actions"]:
+                self.actions.append((module_idx, action["title"]))
+                self._bullets[action["title"]] = action["bullets"]
+        self._build_index()
+
+    @classmethod
+    def from_file(cls, path=CATALOG_PATH, extra_modules=()):
+        """Catalog from ``path``, with generated ``extra_modules`` appended."""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        data["modules"] = data["modules"] + [m for m in extra_modules if m]
+        return cls(data)
+
+    def _build_index(self):
+        postings = defaultdict(set)
+        for action_id, (_, title) in enumerate(self.actions):
+            for text in [title, *self._bullets[title]]:
+                for term in tokenize(text):
+                    postings[term].add(action_id)
+        self._terms = sorted(postings)
+        self._postings = [postings[term] for term in self._terms]
+
+    def bullets(self, title):
+        return self._bullets.get(title)
+
+    def color(self, module_idx):
+        return self.colors[module_idx % len(self.colors)]
+
+    def _prefix_matches(self, prefix):
+        # Terms sharing a prefix are contiguous in the sorted vocabulary
+        lo = bisect.bisect_left(self._terms, prefix)
+        hi = bisect.bisect_left(self._terms, prefix + "\uffff")
+        matches = set()
+        for postings in self._postings[lo:hi]:
+            matches |= postings
+        return matches
+
+    def search(self, query="", modules=None):
+        """Ids of actions matching every query term (as a word prefix), in catalog order."""
+        terms = tokenize(query)
+        if terms:
+            hits = None
+            for term in sorted(set(terms), key=len, reverse=True):
+                matches = self._prefix_matches(term)
+                hits = matches if hits is None else hits & matches
+                if not hits:
+                    return []
+            ids = sorted(hits)
+        else:
+            ids = range(len(self.actions))
+        if modules:
+            wanted = {self.modules.index(name) for name in modules if name in self.modules}
+            ids = [i for i in ids if self.actions[i][0] in wanted]
+        return list(ids)
@@ -0,0 +1,187 @@
+"""Dictionary-encoded cube over the aggregate state, for roll-up and drill-down queries.
+
+Each marginal of the state (see ``aggregates.MARGINALS``) stores every
+dimension as a small integer code per cell plus its list of values, and
+every measure as a flat float array. Each dimension value keeps the sorted
+list of cells holding it, so a query starts from the shortest of those lists
+and only touches the matching cells, never the raw transactions. A query is
+answered from the smallest marginal holding all the dimensions it uses.
+Answers are memoized, so a repeated card or dashboard question costs a
+dictionary lookup.
+"""
+import numpy as np
+import pandas as pd
+
+from aggregates import COUNT, MARGINALS, MC_BUCKET, MC_BUCKETS, MEASURES, aggregate
+from data_store import WEIGHT_BAND, WEIGHT_BANDS
+
+STATS = ("count", "sum", "mean", "std")
+MEMO_SIZE = 4096
+# Dimensions listed in their natural order rather than alphabetically
+ORDERED = {WEIGHT_BAND: WEIGHT_BANDS, MC_BUCKET: MC_BUCKETS}
+
+
+class Marginal:
+    """Encoded cells of one marginal table of the aggregate state."""
+
+    def __init__(self, frame):
+        self.dims = list(frame.index.names)
+        self.values = {}
+        self.codes = {}
+        self._postings = {}
+        for dim in self.dims:
+            codes, values = _factorize(frame.index.get_level_values(dim), ORDERED.get(dim))
+            self.values[dim] = values
+            self.codes[dim] = codes
+            order = np.argsort(codes, kind="stable").astype("int32")
+            bounds = np.searchsorted(codes[order], np.arange(len(values) + 1))
+            self._postings[dim] = [order[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+        self._lookup = {dim: {value: code for code, value in enumerate(values)} for dim, values in self.values.items()}
+        self._measures = {COUNT: frame[COUNT].to_numpy(dtype="float64")}
+        for m in MEASURES:
+            for stat in ("sum", "sumsq"):
+                self._measures[f"{m}_{stat}"] = frame[f"{m}_{stat}"].to_numpy(dtype="float64")
+
+    def __len__(self):
+        return len(self._measures[COUNT])
+
+    # -------------------
+    # Selection
+    # -------------------
+    def _allowed_codes(self, dim, allowed):
+        if dim not in self._lookup:
+            raise KeyError(f"Unknown cube dimension: {dim}")
+        allowed = allowed if isinstance(allowed, (list, tuple, set, frozenset)) else [allowed]
+        lookup = self._lookup[dim]
+        return [lookup[v] for v in allowed if v in lookup]
+
+    def select(self, **where):
+        """Indices of the cells matching every filter in ``where``."""
+        filters = [(dim, self._allowed_codes(dim, allowed)) for dim, allowed in where.items()]
+        if not filters:
+            return np.arange(len(self), dtype="int32")
+        if any(not codes for _, codes in filters):
+            return np.zeros(0, dtype="int32")
+
+        def size(item):
+            dim, codes = item
+            return sum(len(self._postings[dim][c]) for c in codes)
+
+        filters.sort(key=size)
+        dim, codes = filters[0]
+        cells = self._postings[dim][codes[0]] if len(codes) == 1 else np.sort(
+            np.concatenate([self._postings[dim][c] for c in codes]))
+        for dim, codes in filters[1:]:
+            if not len(cells):
+                break
+            keep = np.zeros(len(self.values[dim]), dtype=bool)
+            keep[codes] = True
+            cells = cells[keep[self.codes[dim][cells]]]
+        return cells
+
+    # -------------------
+    # Sums
+    # -------------------
+    def sums(self, measure, cells, groups=None, n_groups=1):
+        def total(column):
+            values = self._measures[column][cells]
+            if groups is None:
+                return np.array([values.sum()])
+            return np.bincount(groups, weights=values, minlength=n_groups)
+
+        n = total(COUNT)
+        if measure is None:
+            return n, None, None
+        return n, total(f"{measure}_sum"), total(f"{measure}_sumsq")
+
+
+class Cube:
+    """Read-only cube built from an aggregate state (see ``aggregates``).
+
+    Filters are given per dimension as a value or a list of allowed values,
+    e.g. ``cube.query("mean", DISCOUNT_PCT, brand="ZOYA", region="South 3")``.
+    A query whose dimensions no single marginal holds raises ``KeyError``.
+    """
+
+    def __init__(self, state):
+        # Smallest first, so the first marginal that covers a query is the cheapest
+        self.marginals = sorted((Marginal(state[name]) for name in MARGINALS), key=len)
+        self._memo = {}
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(aggregate(df))
+
+    def __len__(self):
+        return sum(len(m) for m in self.marginals)
+
+    def marginal(self, dims):
+        """The smallest marginal holding every dimension in ``dims``."""
+        for marginal in self.marginals:
+            if set(dims) <= set(marginal.dims):
+                return marginal
+        raise KeyError(f"No cube marginal holds all of {sorted(dims)}")
+
+    # -------------------
+    # Queries
+    # -------------------
+    def query(self, stat="count", measure=None, by=None, **where):
+        """``stat`` of ``measure`` over the cells matching ``where``.
+
+        ``stat`` is one of ``count``, ``sum``, ``mean`` or ``std`` (``count``
+        needs no measure). Without ``by`` the answer is a float (``nan`` for
+        an empty mean/std); with ``by`` it is a drill-down ``{value: answer}``
+        over the values of that dimension present in the selection.
+        """
+        if stat not in STATS:
+            raise ValueError(f"Unknown stat {stat!r}; expected one of {STATS}")
+        if stat != "count" and measure not in MEASURES:
+            raise ValueError(f"Unknown measure {measure!r}; expected one of {MEASURES}")
+        key = (stat, measure, by, tuple(sorted((d, _freeze(v)) for d, v in where.items())))
+        if key in self._memo:
+            return self._memo[key]
+
+        marginal = self.marginal([*where, *([by] if by is not None else [])])
+        cells = marginal.select(**where)
+        if by is None:
+            result = float(_reduce(stat, *marginal.sums(measure, cells))[0])
+        else:
+            groups = marginal.codes[by][cells]
+            n, total, sumsq = marginal.sums(measure, cells, groups, len(marginal.values[by]))
+            answers = _reduce(stat, n, total, sumsq)
+            result = {marginal.values[by][code]: float(answers[code]) for code in np.flatnonzero(n)}
+
+        if len(self._memo) >= MEMO_SIZE:
+            self._memo.clear()
+        self._memo[key] = result
+        return result
+
+
+def _reduce(stat, n, total, sumsq):
+    if stat == "count":
+        return n
+    if stat == "sum":
+        return total
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(n > 0, total / n, np.nan)
+        if stat == "mean":
+            return mean
+        return np.sqrt(np.clip(sumsq / n - mean**2, 0, None))
+
+
+def _factorize(level, order=None):
+    codes, uniques = pd.factorize(level, sort=True)
+    values = uniques.tolist()
+    if order is not None:
+        rank = {v: i for i, v in enumerate(order)}
+        ordered = sorted(range(len(values)), key=lambda i: (rank.get(values[i], len(rank)), str(values[i])))
+        remap = np.empty(len(values), dtype="int64")
+        remap[ordered] = np.arange(len(values))
+        codes = remap[codes] if len(codes) else codes
+        values = [values[i] for i in ordered]
+    dtype = "uint8" if len(values) <= 2**8 else "uint16" if len(values) <= 2**16 else "uint32"
+    return codes.astype(dtype), values
+
+
+def _freeze(value):
+    return frozenset(value) if isinstance(value, (list, tuple, set, frozenset)) else value
@@ -0,0 +1,299 @@
+"""Columnar Parquet cache in front of the Excel/CSV transaction source.
+
+The first load of a workbook parses it once, fixes the column dtypes and
+writes a Parquet copy next to a small manifest describing the source file.
+Later loads memory-map that copy and read only the requested columns. The
+cache is rebuilt when the source's mtime changes and its content hash no
+longer matches the manifest.
+
+``refresh_incremental`` keeps state derived from the transactions
+(aggregates, detectors) current with the history file plus the daily files
+dropped next to it.
+"""
+import collections
+import hashlib
+import json
+import logging
+import os
+import time
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from page_helpers import daily_files, fingerprint
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = ".cache"
+# Bumped whenever ``normalize`` or the row order changes what a cached copy
+# holds, so caches and state built from the older form are rebuilt
+CACHE_VERSION = 3
+# Row groups bound the memory of a streamed read (see ``iter_chunks``)
+ROW_GROUP_SIZE = 500_000
+# The most recent ``load_frame`` reports, oldest first (see the app's
+# Performance panel)
+LOAD_REPORTS = collections.deque(maxlen=50)
+
+# ===================
+# SOURCE SCHEMA
+# ===================
+# One row per sold or returned line item.
+DATE = "date"
+BILL = "bill_no"
+CUSTOMER = "customer_id"
+BRAND = "brand"
+REGION = "region"
+STONE = "stone_category"
+WEIGHT_BAND = "weight_band"
+MAKING_CHARGES = "making_charges"
+SALES = "sales_value"
+DISCOUNT = "discount"
+DISCOUNT_PCT = "discount_pct"
+IS_RETURN = "is_return"
+
+CATEGORICAL = [BRAND, REGION, STONE, WEIGHT_BAND]
+# Codes the insights match against fixed names ("ZOYA", "DIA"); sources spell
+# them in any case, so they are upper-cased on the way in
+UPPER_CASE = [BRAND, STONE]
+NUMERIC = [MAKING_CHARGES, SALES, DISCOUNT, DISCOUNT_PCT]
+WEIGHT_BANDS = ["Very Light", "Light", "Medium", "Heavy", "Very Heavy"]
+
+
+# ===================
+# HELPERS
+# ===================
+def _rss_mb():
+    # Current resident set size; falls back to the peak where /proc is absent
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def file_hash(path, chunk_size=2**20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest(path):
+    """The JSON manifest at ``path``, or ``None`` if it is missing or unreadable."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(path, manifest):
+    """Write ``manifest`` as JSON atomically, so readers never see half a file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def cache_paths(path, cache_dir=CACHE_DIR):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{stem}.parquet"), os.path.join(cache_dir, f"{stem}.json")
+
+
+def read_source(path):
+    if path.endswith((".xlsx", ".xlsm", ".xls")):
+        # pandas picks openpyxl for .xlsx/.xlsm and xlrd for legacy .xls
+        df = pd.read_excel(path)
+    else:
+        df = pd.read_csv(path)
+    return normalize(df)
+
+
+def normalize(df):
+    """Apply the cache dtypes: categoricals, floats, datetimes and booleans."""
+    df = df.copy()
+    if DATE in df:
+        df[DATE] = pd.to_datetime(df[DATE])
+    if IS_RETURN in df:
+        df[IS_RETURN] = df[IS_RETURN].astype(bool)
+    for col in NUMERIC:
+        if col in df:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    for col in UPPER_CASE:
+        if col in df:
+            df[col] = df[col].astype(str).str.strip().str.upper().where(df[col].notna())
+    for col in CATEGORICAL:
+        if col in df:
+            df[col] = df[col].astype("category")
+    if WEIGHT_BAND in df:
+        df[WEIGHT_BAND] = df[WEIGHT_BAND].cat.set_categories(WEIGHT_BANDS, ordered=True)
+    return df
+
+
+# ===================
+# CACHE
+# ===================
+def _manifest_is_current(path, manifest_path):
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if manifest.get("version") != CACHE_VERSION:
+        return False
+    stat = os.stat(path)
+    if manifest.get("mtime_ns") == stat.st_mtime_ns and manifest.get("size") == stat.st_size:
+        return True
+    # Touched but not edited: refresh the manifest instead of rebuilding
+    if manifest.get("sha256") == file_hash(path):
+        manifest.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        write_manifest(manifest_path, manifest)
+        return True
+    return False
+
+
+def build_cache(path, cache_dir=CACHE_DIR):
+    """Write the Parquet copy of ``path``, in date order, and its manifest."""
+    parquet_path, manifest_path = cache_paths(path, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    stat = os.stat(path)
+    df = read_source(path)
+    if DATE in df:
+        df = df.sort_values(DATE, kind="stable", ignore_index=True)
+    tmp_path = parquet_path + ".tmp"
+    df.to_parquet(tmp_path, index=False, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp_path, parquet_path)
+    write_manifest(manifest_path, {
+        "source": os.path.abspath(path),
+        "version": CACHE_VERSION,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": file_hash(path),
+        "rows": len(df),
+    })
+    return parquet_path
+
+
+def load_frame(path, columns=None, cache_dir=CACHE_DIR):
+    """Load ``columns`` of the source at ``path`` through the Parquet cache.
+
+    The load time, resident memory and whether the cache had to be built are
+    logged, attached to the result as ``df.attrs["load_report"]`` and kept
+    in ``LOAD_REPORTS``.
+    """
+    started = time.perf_counter()
+    rss_before = _rss_mb()
+    parquet_path, manifest_path = cache_paths(path, cache_dir)
+    cold = not (os.path.exists(parquet_path) and _manifest_is_current(path, manifest_path))
+    if cold:
+        build_cache(path, cache_dir)
+
+    if columns is not None:
+        available = set(pq.read_schema(parquet_path).names)
+        columns = [col for col in columns if col in available]
+    df = pq.read_table(parquet_path, columns=columns, memory_map=True).to_pandas()
+
+    report = {
+        "loaded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "source": path,
+        "cold": cold,
+        "seconds": round(time.perf_counter() - started, 3),
+        "rss_mb": round(_rss_mb(), 1),
+        "rss_delta_mb": round(_rss_mb() - rss_before, 1),
+        "rows": len(df),
+        "columns": len(df.columns),
+    }
+    df.attrs["load_report"] = report
+    LOAD_REPORTS.append(report)
+    logger.info("%s load of %s: %.3fs, %d rows x %d cols, RSS %.1f MB (%+.1f MB)",
+                "Cold" if cold else "Cached", path, report["seconds"], report["rows"],
+                report["columns"], report["rss_mb"], report["rss_delta_mb"])
+    return df
+
+
+def iter_chunks(path, columns, chunk_rows=ROW_GROUP_SIZE, cache_dir=CACHE_DIR, ordered=False):
+    """Yield ``columns`` of the source at ``path`` in frames of at most ``chunk_rows`` rows.
+
+    Reads the Parquet cache batch by batch when it is current. Otherwise a
+    CSV source is streamed straight from disk, so memory stays bounded by
+    the chunk size either way; workbooks cannot be streamed and go through
+    the cache. With ``ordered`` the rows come in date order, which always
+    goes through the cache.
+    """
+    parquet_path, manifest_path = cache_paths(path, cache_dir)
+    cached = os.path.exists(parquet_path) and _manifest_is_current(path, manifest_path)
+    if not cached and not ordered and not path.endswith((".xlsx", ".xlsm", ".xls")):
+        for chunk in pd.read_csv(path, usecols=lambda col: col in columns, chunksize=chunk_rows):
+            yield normalize(chunk)
+        return
+    if not cached:
+        build_cache(path, cache_dir)
+    parquet = pq.ParquetFile(parquet_path, memory_map=True)
+    columns = [col for col in columns if col in parquet.schema_arrow.names]
+    for batch in parquet.iter_batches(batch_size=chunk_rows, columns=columns):
+        yield batch.to_pandas()
+
+
+# ===================
+# INCREMENTAL STATE
+# ===================
+def refresh_incremental(history_path, daily_dir, manifest_path, start, fold, load, save,
+                        columns=None, version=None):
+    """Bring state derived from the history and daily files up to date.
+
+    The state is whatever the caller folds transactions into:
+
+    ``start()``          a fresh, empty state
+    ``fold(state, df)``  the state with the transactions in ``df`` added
+    ``load(manifest)``   the state saved earlier (may raise OSError/ValueError)
+    ``save(state)``      persists the state and returns extra manifest fields
+
+    Only daily files not yet folded in are read. The state is rebuilt from
+    the history when the history file changes, an ingested daily file is
+    edited, or ``version`` or ``CACHE_VERSION`` differs from the saved one,
+    since contributions cannot be taken back out. Returns ``(state, manifest)``.
+    """
+    manifest = read_manifest(manifest_path)
+    state = None
+    if manifest is not None and manifest.get("version") == version and manifest.get("cache") == CACHE_VERSION:
+        try:
+            state = load(manifest)
+        except (OSError, ValueError):
+            manifest = None
+    else:
+        manifest = None
+
+    history = fingerprint(history_path)
+    ingested = (manifest or {}).get("daily", {})
+    files = daily_files(daily_dir)
+    current = {os.path.basename(p): fingerprint(p) for p in files}
+
+    stale = manifest is None or manifest.get("history") != history or any(
+        current.get(name) != fp for name, fp in ingested.items()
+    )
+    if stale:
+        logger.info("Rebuilding %s from %s", manifest_path, history_path)
+        state = start()
+        if history:
+            state = fold(state, load_frame(history_path, columns=columns))
+        ingested = {}
+
+    new_files = [p for p in files if os.path.basename(p) not in ingested]
+    if not new_files and not stale:
+        return state, manifest
+
+    for path in new_files:
+        state = fold(state, read_source(path))
+    if new_files:
+        logger.info("Folded %d new daily file(s) into %s", len(new_files), manifest_path)
+    ingested = {**ingested, **{os.path.basename(p): current[os.path.basename(p)] for p in new_files}}
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    manifest = {**save(state), "version": version, "cache": CACHE_VERSION, "history": history, "daily": ingested}
+    write_manifest(manifest_path, manifest)
+    return state, manifest
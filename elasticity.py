@@ -0,0 +1,111 @@
+"""Discount elasticity of daily transactions per weekday x brand x region segment.
+
+For every segment the number of sale transactions on a day is regressed on
+that day's average discount %, one observation per day the segment traded:
+
+    transactions = intercept + slope * discount_pct
+
+``slope`` is the extra transactions per day for one more point of discount.
+All segments are fitted together: their 2x2 normal equations are stacked
+into one array and handed to a single batched ``np.linalg.solve``. The days
+come from the per-day table of the aggregate state, so the fit covers the
+merged daily files like every other card figure, and refitting only costs
+one pass over a row per day x brand x region.
+"""
+import numpy as np
+import pandas as pd
+
+from aggregates import WEEKDAY
+from data_store import BRAND, DATE, REGION
+
+SEGMENT = [WEEKDAY, BRAND, REGION]
+
+MIN_DAYS = 8          # days a segment must trade on to get a slope
+MIN_SPREAD = 0.01     # variance of the daily discount % (points^2) needed to identify a slope
+WEEKS_PER_MONTH = 365.25 / 12 / 7
+
+
+# ===================
+# FIT
+# ===================
+def fit(daily):
+    """One row per segment with its intercept, slope and the slope's standard error.
+
+    ``daily`` is the aggregate state's per-day table (``aggregates.DAILY``);
+    None is returned when it is empty. Segments that traded on fewer than
+    ``MIN_DAYS`` days, or whose discount barely moved, keep a zero slope and
+    ``fitted`` False. Per-week totals (``txns``, ``sales``, ``gross``) are
+    over every date of that weekday in the data, including days the segment
+    did not trade.
+    """
+    if not len(daily):
+        return None
+    days = daily.reset_index()
+    days[DATE] = pd.to_datetime(days[DATE])
+    days["discount_pct"] = days["discount_pct_sum"] / days["txns"]
+    days[WEEKDAY] = days[DATE].dt.dayofweek
+    codes, segments = pd.MultiIndex.from_frame(days[SEGMENT]).factorize()
+    n_segments = len(segments)
+    x = days["discount_pct"].to_numpy()
+    y = days["txns"].to_numpy()
+
+    def total(weights):
+        return np.bincount(codes, weights=weights, minlength=n_segments)
+
+    # Every segment comes from at least one day, so n >= 1
+    n, sx, sy, sxx, sxy, syy = total(None), total(x), total(y), total(x * x), total(x * y), total(y * y)
+    spread = sxx / n - (sx / n) ** 2
+    fitted = (n >= MIN_DAYS) & (spread >= MIN_SPREAD)
+
+    # Stacked normal equations [[n, sx], [sx, sxx]] @ [a, b] = [sy, sxy];
+    # unidentified segments get an identity system so the batch stays solvable
+    lhs = np.empty((n_segments, 2, 2))
+    lhs[:, 0, 0], lhs[:, 0, 1], lhs[:, 1, 0], lhs[:, 1, 1] = n, sx, sx, sxx
+    rhs = np.stack([sy, sxy], axis=1)
+    lhs[~fitted] = np.eye(2)
+    rhs[~fitted] = 0.0
+    coef = np.linalg.solve(lhs, rhs[:, :, None])[:, :, 0]
+    intercept = np.where(fitted, coef[:, 0], sy / n)
+    slope = coef[:, 1]
+
+    # Residual variance from the sums, then se(slope) = sqrt(s2 / Sxx)
+    rss = syy - intercept * sy - slope * sxy
+    s2 = np.where(fitted, np.maximum(rss, 0.0) / np.maximum(n - 2, 1), np.nan)
+    slope_se = np.sqrt(s2 / np.where(fitted, n * spread, 1.0))
+
+    weeks = days.groupby(WEEKDAY)[DATE].nunique()
+    out = pd.MultiIndex.from_tuples(segments, names=SEGMENT).to_frame(index=False)
+    out["days"] = n.astype("int64")
+    out["intercept"] = intercept
+    out["slope"] = slope
+    out["slope_se"] = slope_se
+    out["fitted"] = fitted
+    out["mean_discount_pct"] = sx / n
+    out["weeks"] = out[WEEKDAY].map(weeks).to_numpy(dtype="int64")
+    for column in ("txns", "sales", "gross"):
+        out[column] = total(days[column].to_numpy())
+    return out
+
+
+# ===================
+# PROJECTIONS
+# ===================
+def project(table, weekdays, change_pct):
+    """Weekly effect of moving the discount on ``weekdays`` by ``change_pct`` points.
+
+    Returns the change in transactions, in sales value and in discount
+    given, each per week and summed over every brand x region segment.
+    """
+    rows = table[table[WEEKDAY].isin(list(weekdays))]
+    weeks = rows["weeks"].clip(lower=1).to_numpy()
+    ticket = (rows["sales"] / rows["txns"]).to_numpy()
+    gross_ticket = (rows["gross"] / rows["txns"]).to_numpy()
+    txns = rows["slope"].to_numpy() * change_pct
+    base_gross = rows["gross"].to_numpy() / weeks
+    rate = (rows["mean_discount_pct"].to_numpy() + change_pct) / 100
+    return {
+        "txns": float(txns.sum()),
+        "sales": float((txns * ticket).sum()),
+        # The rate change on the existing sales, plus the discount on the sales gained or lost
+        "discount": float((base_gross * change_pct / 100 + txns * gross_ticket * rate).sum()),
+    }
@@ -0,0 +1,202 @@
+"""Insight metrics computed from the sales/returns transaction data.
+
+``compute_metrics`` turns the aggregate state (see ``aggregates``) into the
+figures quoted on the action cards, already formatted for display. Every
+figure has a default in ``page_helpers.DEFAULT_METRICS`` (the numbers from the original
+analysis), which is used whenever the dataset or a segment in it is missing.
+"""
+import numpy as np
+
+from data_store import BRAND, DISCOUNT, DISCOUNT_PCT, REGION, SALES, WEIGHT_BAND
+from aggregates import BILL_BANDS, BILLS, DAILY, DAY, MC_BUCKETS, WEEKDAY, bills_over
+from cube import Cube
+from elasticity import WEEKS_PER_MONTH, fit as fit_elasticity, project
+from page_helpers import DEFAULT_METRICS, fmt_count, fmt_inr, fmt_pct, ordinal
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+# Brand and stone codes as ``data_store.normalize`` spells them (upper case)
+ZOYA = "ZOYA"
+TANISHQ = "TANISHQ"
+MID_RANGE_STONES = ["DIA", "GIS"]
+DIAMOND_STONE = "DIA"
+# Making charges above ₹50,000
+HIGH_MC_BUCKETS = MC_BUCKETS[3:]
+WORKWEEK = [0, 1, 2, 3, 4]
+WEEKEND = [5, 6]
+# Discount cut, in points, the Saturday Sales Push card sizes for its steepest days
+TRIM_PCT = 0.5
+
+
+
+# ===================
+# METRICS
+# ===================
+def _top(answers, n):
+    # Largest values first; ties keep the dimension's order
+    return sorted(answers, key=lambda k: -answers[k])[:n]
+
+
+def _weight_metrics(cube):
+    band_pct = cube.query("mean", DISCOUNT_PCT, by=WEIGHT_BAND, is_return=False)
+    heavy = cube.query("mean", DISCOUNT_PCT, weight_band=["Heavy", "Very Heavy"], is_return=False)
+    light = [band_pct[band] for band in ("Very Light", "Light") if band in band_pct]
+    metrics = {}
+    if not np.isnan(heavy):
+        metrics["heavy_discount_pct"] = fmt_pct(heavy, 1)
+    if "Medium" in band_pct:
+        metrics["medium_discount_pct"] = fmt_pct(band_pct["Medium"], 1)
+    if light:
+        metrics["light_discount_range"] = f"{min(light):.1f}–{max(light):.1f}%"
+    return metrics
+
+
+def _item_metrics(cube):
+    sold = cube.query("count", is_return=False)
+    if not sold:
+        return {}
+    mid_stone = cube.query("count", stone_category=MID_RANGE_STONES, is_return=False)
+    return {
+        "high_mc_items": fmt_count(cube.query("count", mc_bucket=HIGH_MC_BUCKETS, is_return=False)),
+        "mid_stone_txns": fmt_count(mid_stone),
+        "mid_stone_share": f"{mid_stone / sold:.0%}",
+    }
+
+
+def _bill_metrics(state):
+    return {
+        "capped_bills": fmt_count(bills_over(state, 100_000)),
+        "split_bills": fmt_count(bills_over(state, 50_000)),
+    }
+
+
+def _brand_metrics(cube):
+    # "Orders" counts every sold or returned line item of the brand
+    orders = cube.query("count", by=BRAND)
+    sales = cube.query("sum", SALES, by=BRAND, is_return=False)
+    avg_discount = cube.query("mean", DISCOUNT, by=BRAND, is_return=False)
+    discount_pct = cube.query("mean", DISCOUNT_PCT, by=BRAND, is_return=False)
+    returns = cube.query("count", by=BRAND, is_return=True)
+    metrics = {}
+    for brand in sales:
+        key = str(brand).lower()
+        n_returns = int(returns.get(brand, 0))
+        metrics[f"{key}_sales"] = fmt_inr(sales[brand])
+        metrics[f"{key}_orders"] = str(int(orders[brand]))
+        metrics[f"{key}_avg_discount"] = fmt_inr(avg_discount[brand])
+        metrics[f"{key}_returns"] = str(n_returns) if n_returns else "zero"
+        metrics[f"{key}_discount_pct"] = fmt_pct(discount_pct[brand], 1)
+
+    by_region = cube.query("mean", DISCOUNT_PCT, by=REGION, brand=ZOYA, is_return=False)
+    if by_region:
+        peak = _top(by_region, 1)[0]
+        metrics["zoya_peak_region"] = str(peak)
+        metrics["zoya_peak_discount_pct"] = fmt_pct(by_region[peak])
+    return metrics
+
+
+def _return_metrics(cube):
+    total = cube.query("count", is_return=True)
+    if not total:
+        return {}
+    diamonds = cube.query("count", stone_category=DIAMOND_STONE, is_return=True)
+
+    by_day = cube.query("count", by=DAY, is_return=True)
+    spikes = sorted(_top(by_day, 3))
+    days = [ordinal(day) for day in spikes]
+    counts = [str(int(by_day[day])) for day in spikes]
+    parts = [f"the {days[0]} ({counts[0]} returns)"] + [f"{d} ({c})" for d, c in zip(days[1:], counts[1:])]
+    spike_text = parts[0] if len(parts) == 1 else ", ".join(parts[:-1]) + ", and " + parts[-1]
+
+    metrics = {
+        "total_returns": fmt_count(total),
+        "diamond_returns": fmt_count(diamonds),
+        "diamond_return_share": f"{diamonds / total:.0%}",
+        "return_spike_days": spike_text,
+    }
+    # Without Tanishq in the data the card keeps its default figures
+    if cube.query("count", brand=TANISHQ):
+        tanishq_stone = cube.query("count", brand=TANISHQ, stone_category=MID_RANGE_STONES, is_return=True)
+        metrics["tanishq_stone_returns"] = fmt_count(tanishq_stone)
+        metrics["tanishq_stone_return_share"] = f"{tanishq_stone / total:.0%}"
+    return metrics
+
+
+def _weekday_metrics(cube, elasticity=None):
+    txns = cube.query("count", by=WEEKDAY, is_return=False)
+    mean = cube.query("mean", DISCOUNT_PCT, by=WEEKDAY, is_return=False)
+    metrics = {
+        "weekend_discount_pct": fmt_pct(cube.query("mean", DISCOUNT_PCT, weekday=WEEKEND, is_return=False)),
+        "weekday_discount_pct": fmt_pct(cube.query("mean", DISCOUNT_PCT, weekday=WORKWEEK, is_return=False)),
+        "weekend_txns": fmt_count(cube.query("count", weekday=WEEKEND, is_return=False)),
+        "weekday_txns": fmt_count(cube.query("count", weekday=WORKWEEK, is_return=False)),
+    }
+    for rank, day in enumerate(_top(mean, 2), start=1):
+        metrics[f"steep_day_{rank}"] = WEEKDAYS[day]
+        metrics[f"steep_day_{rank}_pct"] = fmt_pct(mean[day])
+        metrics[f"steep_day_{rank}_txns"] = fmt_count(txns[day])
+
+    if txns.get(5) and txns.get(6):
+        metrics.update({
+            "saturday_txns": fmt_count(txns[5]),
+            "saturday_discount_pct": fmt_pct(mean[5]),
+            "sunday_txns": fmt_count(txns[6]),
+            "sunday_discount_pct": fmt_pct(mean[6]),
+            "sunday_lift": f"{txns[6] / txns[5] - 1:.0%}",
+            "sunday_discount_gap": fmt_pct(mean[6] - mean[5], 1),
+        })
+    if elasticity is not None:
+        metrics.update(_elasticity_metrics(elasticity, _top(mean, 2), mean))
+    return metrics
+
+
+def _elasticity_metrics(elasticity, steep_days, mean):
+    # Projections from the per-segment discount response (see ``elasticity``)
+    trim = project(elasticity, steep_days, -TRIM_PCT)
+    saved = -trim["discount"] * WEEKS_PER_MONTH
+    lost = -trim["txns"] * WEEKS_PER_MONTH
+    if lost < 1:
+        metrics = {"discount_trim_impact": f"saves about {fmt_inr(saved)} of discount monthly with no projected drop in volume"}
+    else:
+        metrics = {
+            "discount_trim_impact": f"saves about {fmt_inr(saved)} of discount monthly for a projected "
+                                    f"{fmt_count(round(lost))} fewer sales ({fmt_inr(-trim['sales'] * WEEKS_PER_MONTH)})"
+        }
+
+    gap = mean.get(6, np.nan) - mean.get(5, np.nan)
+    if gap > 0:
+        push = project(elasticity, [5], gap)
+        if push["txns"] >= 1:
+            metrics["saturday_push_impact"] = (
+                f"up to Sunday's discount is projected to add ~{fmt_count(round(push['txns']))} sales weekly "
+                f"({fmt_inr(push['sales'])}) for {fmt_inr(push['discount'])} more discount"
+            )
+        else:
+            metrics["saturday_push_impact"] = (
+                "has to win sales through campaigns, since matching Sunday's discount there is projected to add none"
+            )
+    return metrics
+
+
+def compute_metrics(state=None, cube=None):
+    """Card figures merged over the defaults.
+
+    Every figure comes from the aggregate ``state`` (``aggregates.refresh``
+    or ``aggregates.aggregate``): bill-level ones from its bill tables,
+    the rest as queries on its ``cube`` (built from the state when not
+    given). All of them therefore include the merged daily files, and so
+    does the discount elasticity fitted on its per-day table to size the
+    discount changes the weekday card proposes.
+    """
+    metrics = dict(DEFAULT_METRICS)
+    if state is None:
+        return metrics
+    if len(state[BILLS]) or len(state[BILL_BANDS]):
+        metrics.update(_bill_metrics(state))
+    cube = cube if cube is not None else Cube(state)
+    if len(cube):
+        metrics.update(_weight_metrics(cube))
+        metrics.update(_item_metrics(cube))
+        metrics.update(_brand_metrics(cube))
+        metrics.update(_return_metrics(cube))
+        metrics.update(_weekday_metrics(cube, fit_elasticity(state[DAILY])))
+    return metrics
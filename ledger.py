@@ -0,0 +1,215 @@
+"""Durable SQLite ledger of every assignment sent from the app.
+
+All writes from every session go through one writer thread that drains a
+queue and commits in batches, so concurrent sessions never contend for the
+database lock. Reads open their own connections; with WAL journaling they
+run alongside the writer without blocking it.
+
+An assignment is open until its deadline passes or it is marked completed.
+Its ``status`` follows the email (queued, sending, sent, failed) until then;
+a failed row whose (action, team, deadline) is sent again is marked
+superseded, so only the resend stays open.
+"""
+import datetime
+import logging
+import os
+import queue
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+LEDGER_PATH = os.path.join("data", "ledger.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assignments (
+    id INTEGER PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    action TEXT NOT NULL,
+    team TEXT NOT NULL,
+    recipients TEXT NOT NULL,
+    deadline TEXT NOT NULL,
+    status TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    UNIQUE (job_id, action)
+);
+CREATE INDEX IF NOT EXISTS idx_assignments_team ON assignments (team, status);
+CREATE INDEX IF NOT EXISTS idx_assignments_action ON assignments (action);
+CREATE INDEX IF NOT EXISTS idx_assignments_deadline ON assignments (deadline, status, team);
+CREATE INDEX IF NOT EXISTS idx_assignments_status ON assignments (status, created_at);
+"""
+
+SENT = "sent"
+FAILED = "failed"
+COMPLETED = "completed"
+SUPERSEDED = "superseded"
+# Statuses the outbox no longer moves a row out of
+CLOSED_STATUSES = (COMPLETED, SUPERSEDED)
+BATCH_SIZE = 500
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+class Ledger:
+    """Assignment ledger with a single writer thread.
+
+    ``record``, ``update_status`` and ``complete`` only enqueue; ``flush``
+    waits until everything queued so far is committed.
+    """
+
+    def __init__(self, path=LEDGER_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        self._queue = queue.Queue()
+        # Status updates that arrived before their assignment rows were written
+        self._early_status = {}
+        self._writer = threading.Thread(target=self._run, name="ledger-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # -------------------
+    # Writes
+    # -------------------
+    def record(self, job_id, actions, team, recipients, deadline, kind="single", status="queued"):
+        self._queue.put(("record", (job_id, list(actions), team, ", ".join(recipients), str(deadline), kind, status)))
+
+    def update_status(self, job_id, status):
+        self._queue.put(("status", (job_id, status)))
+
+    def complete(self, action, team, deadline):
+        """Mark the open assignment of ``action`` to ``team`` due ``deadline`` as done."""
+        self._queue.put(("complete", (action, team, str(deadline))))
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            ops = [self._queue.get()]
+            while len(ops) < BATCH_SIZE:
+                try:
+                    ops.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in ops
+            try:
+                with conn:
+                    for op in ops:
+                        if op is not None:
+                            self._apply(conn, *op)
+            except sqlite3.Error:
+                logger.exception("Failed to write %d ledger operation(s)", len(ops))
+            for _ in ops:
+                self._queue.task_done()
+            if stop:
+                conn.close()
+                return
+
+    def _apply(self, conn, kind, args):
+        now = _now()
+        if kind == "record":
+            job_id, actions, team, recipients, deadline, assignment_kind, status = args
+            status = self._early_status.pop(job_id, status)
+            conn.executemany(
+                "INSERT OR IGNORE INTO assignments "
+                "(job_id, action, team, recipients, deadline, status, kind, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(job_id, action, team, recipients, deadline, status, assignment_kind, now, now) for action in actions],
+            )
+            # A resend replaces the failed attempts at the same assignment
+            conn.executemany(
+                "UPDATE assignments SET status = ?, updated_at = ? "
+                "WHERE action = ? AND team = ? AND deadline = ? AND status = ? AND job_id != ?",
+                [(SUPERSEDED, now, action, team, deadline, FAILED, job_id) for action in actions],
+            )
+        elif kind == "complete":
+            action, team, deadline = args
+            placeholders = ", ".join("?" * len(CLOSED_STATUSES))
+            conn.execute(
+                "UPDATE assignments SET status = ?, updated_at = ? "
+                f"WHERE action = ? AND team = ? AND deadline = ? AND status NOT IN ({placeholders})",
+                (COMPLETED, now, action, team, deadline, *CLOSED_STATUSES),
+            )
+        else:
+            job_id, status = args
+            placeholders = ", ".join("?" * len(CLOSED_STATUSES))
+            updated = conn.execute(
+                f"UPDATE assignments SET status = ?, updated_at = ? WHERE job_id = ? AND status NOT IN ({placeholders})",
+                (status, now, job_id, *CLOSED_STATUSES),
+            ).rowcount
+            if not updated and not conn.execute("SELECT 1 FROM assignments WHERE job_id = ?", (job_id,)).fetchone():
+                self._early_status[job_id] = status
+
+    # -------------------
+    # Queries
+    # -------------------
+    def _query(self, sql, params=()):
+        conn = self._connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def open_per_team(self, today=None):
+        """Count of assignments per team that are neither completed nor past their deadline."""
+        today = str(today or datetime.date.today())
+        placeholders = ", ".join("?" * len(CLOSED_STATUSES))
+        return self._query(
+            "SELECT team, COUNT(*) AS open_assignments, MIN(deadline) AS next_deadline "
+            f"FROM assignments WHERE deadline >= ? AND status NOT IN ({placeholders}) GROUP BY team ORDER BY team",
+            (today, *CLOSED_STATUSES),
+        )
+
+    def open_assignments(self, today=None, limit=100):
+        """Open assignments, soonest deadline first."""
+        today = str(today or datetime.date.today())
+        placeholders = ", ".join("?" * len(CLOSED_STATUSES))
+        return self._query(
+            "SELECT action, team, deadline, status FROM assignments "
+            f"WHERE deadline >= ? AND status NOT IN ({placeholders}) ORDER BY deadline, team, action LIMIT ?",
+            (today, *CLOSED_STATUSES, limit),
+        )
+
+    def sent_since(self, since, limit=100):
+        """Most recent delivered assignments created on or after ``since``, completed ones included."""
+        return self._query(
+            "SELECT action, team, deadline, created_at FROM assignments "
+            "WHERE status IN (?, ?) AND created_at >= ? ORDER BY created_at DESC LIMIT ?",
+            (SENT, COMPLETED, str(since), limit),
+        )
+
+    def sent_this_week(self, today=None, limit=100):
+        today = today or datetime.date.today()
+        return self.sent_since(today - datetime.timedelta(days=today.weekday()), limit)
+
+    def history(self, team=None, action=None, limit=100):
+        clauses, params = [], []
+        if team:
+            clauses.append("team = ?")
+            params.append(team)
+        if action:
+            clauses.append("action = ?")
+            params.append(action)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        return self._query(
+            f"SELECT action, team, deadline, status, created_at FROM assignments {where}"
+            "ORDER BY id DESC LIMIT ?",
+            (*params, limit),
+        )
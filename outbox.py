@@ -0,0 +1,218 @@
+"""Background email outbox shared by every Streamlit session.
+
+Messages are queued and delivered by a single worker thread that keeps one
+authenticated SMTP connection open between sends, so a "Send Action" click
+never waits on the TLS handshake or login.
+"""
+import collections
+import logging
+import queue
+import smtplib
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+# Errors that will not go away by retrying the same message.
+PERMANENT_ERRORS = (
+    smtplib.SMTPAuthenticationError,
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+)
+FINISHED = (SENT, FAILED)
+
+
+class EmailOutbox:
+    """Queue of outgoing emails delivered over a pooled SMTP connection.
+
+    ``submit`` returns a job id immediately; ``status`` reports its delivery
+    state. Submitting the same ``dedupe_key`` twice while the first job is
+    queued, sending or sent returns the original job instead of a new one.
+    ``on_status(job_id, state)``, if given, is called from the worker thread
+    whenever a job changes state. With a ``telemetry`` registry (see
+    ``telemetry.Telemetry``) the outbox records queue wait, SMTP connect and
+    send latencies and delivery counters.
+
+    Finished jobs are forgotten ``job_ttl`` seconds after they finish, or
+    sooner once more than ``max_jobs`` are held, oldest first; ``status``
+    then returns ``None`` and their dedupe keys can be submitted again.
+    """
+
+    def __init__(self, sender, password, host="smtp.gmail.com", port=465, use_ssl=True,
+                 max_retries=3, backoff=1.0, idle_timeout=60.0, timeout=30.0, on_status=None,
+                 telemetry=None, job_ttl=3600.0, max_jobs=10_000):
+        self.sender = sender
+        self.password = password
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.on_status = on_status
+        self.telemetry = telemetry
+        self.job_ttl = job_ttl
+        self.max_jobs = max_jobs
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._keys = {}
+        # Finished job ids in the order they finished, with their finish time
+        self._finished = collections.OrderedDict()
+        self._server = None
+        self._worker = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+        self._worker.start()
+
+    # -------------------
+    # Public API
+    # -------------------
+    def submit(self, receivers, msg, dedupe_key=None):
+        if isinstance(receivers, str):
+            receivers = [receivers]
+        with self._lock:
+            self._prune()
+            if dedupe_key is not None and dedupe_key in self._keys:
+                job_id = self._keys[dedupe_key]
+                if self._jobs[job_id]["state"] != FAILED:
+                    return job_id
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {"state": QUEUED, "attempts": 0, "error": None, "dedupe_key": dedupe_key}
+            if dedupe_key is not None:
+                self._keys[dedupe_key] = job_id
+        self._queue.put((job_id, list(receivers), msg, time.perf_counter()))
+        return job_id
+
+    def submit_many(self, items):
+        """Queue ``(receivers, msg, dedupe_key)`` items back to back.
+
+        The worker delivers them consecutively over the same connection, so a
+        batch costs one handshake and login however many messages it holds.
+        """
+        return [self.submit(receivers, msg, dedupe_key) for receivers, msg, dedupe_key in items]
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def close(self):
+        self._queue.put(None)
+        self._worker.join(timeout=self.timeout)
+
+    # -------------------
+    # Worker
+    # -------------------
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._disconnect()
+                continue
+            if item is None:
+                self._disconnect()
+                return
+            try:
+                self._deliver(*item)
+            except Exception as e:
+                # An unexpected error fails this job, never the only worker
+                logger.exception("Email job %s failed", item[0])
+                self._count("smtp_errors_total", kind="unexpected")
+                self._disconnect()
+                self._update(item[0], state=FAILED, error=str(e) or type(e).__name__)
+
+    def _deliver(self, job_id, receivers, msg, queued_at):
+        self._observe("email_queue_seconds", time.perf_counter() - queued_at)
+        payload = msg.as_string()
+        for attempt in range(1, self.max_retries + 1):
+            self._update(job_id, state=SENDING, attempts=attempt)
+            try:
+                server = self._connection()
+                started = time.perf_counter()
+                server.sendmail(self.sender, receivers, payload)
+                self._observe("smtp_send_seconds", time.perf_counter() - started)
+            except PERMANENT_ERRORS as e:
+                self._count("smtp_errors_total", kind="permanent")
+                self._disconnect()
+                self._update(job_id, state=FAILED, error=str(e))
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                logger.warning("Email send attempt %d/%d failed: %s", attempt, self.max_retries, e)
+                self._count("smtp_errors_total", kind="transient")
+                self._disconnect()
+                self._update(job_id, error=str(e))
+                if attempt < self.max_retries:
+                    time.sleep(self.backoff * 2 ** (attempt - 1))
+                continue
+            self._update(job_id, state=SENT, error=None)
+            return
+        self._update(job_id, state=FAILED)
+
+    def _connection(self):
+        if self._server is None:
+            started = time.perf_counter()
+            smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+            server = smtp_class(self.host, self.port, timeout=self.timeout)
+            try:
+                if self.password:
+                    server.login(self.sender, self.password)
+            except Exception:
+                server.close()
+                raise
+            self._server = server
+            self._observe("smtp_connect_seconds", time.perf_counter() - started)
+        return self._server
+
+    def _disconnect(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            # The connection is dropped either way
+            self._server.close()
+        self._server = None
+
+    def _prune(self):
+        # Called with the lock held
+        expired = time.monotonic() - self.job_ttl
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if finished_at > expired and len(self._jobs) <= self.max_jobs:
+                break
+            del self._finished[job_id]
+            job = self._jobs.pop(job_id)
+            if self._keys.get(job["dedupe_key"]) == job_id:
+                del self._keys[job["dedupe_key"]]
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            changed = "state" in fields and fields["state"] != job["state"]
+            job.update(fields)
+            if changed and fields["state"] in FINISHED:
+                self._finished[job_id] = time.monotonic()
+                self._finished.move_to_end(job_id)
+        if changed and fields["state"] in FINISHED:
+            self._count("emails_total", state=fields["state"])
+        if changed and self.on_status is not None:
+            try:
+                self.on_status(job_id, fields["state"])
+            except Exception:
+                logger.exception("Email status callback failed")
+
+    def _observe(self, name, seconds):
+        if self.telemetry is not None:
+            self.telemetry.observe(name, seconds)
+
+    def _count(self, name, **labels):
+        if self.telemetry is not None:
+            self.telemetry.inc(name, **labels)
@@ -0,0 +1,182 @@
+"""What the page needs before any transaction data is loaded.
+
+Standard library only, so the app can import it at the top of every script
+run; the modules that need numpy, pandas or pyarrow are imported where they
+are used. Holds the change markers for the source files, the card metric
+defaults and the text helpers for the action cards.
+"""
+import datetime
+import os
+
+DAILY_SUFFIXES = (".csv", ".xlsx", ".xlsm", ".xls")
+# Segment label for "every brand" or "every stone category" (see ``return_spikes``)
+ALL = "All"
+MAX_CARDS = 8
+
+DEFAULT_METRICS = {
+    "heavy_discount_pct": "6.7%",
+    "medium_discount_pct": "6.2%",
+    "light_discount_range": "5.5–6.0%",
+    "high_mc_items": "835",
+    "capped_bills": "142",
+    "mid_stone_txns": "6,281",
+    "mid_stone_share": "nearly 2/3",
+    "split_bills": "371",
+    "zoya_sales": "₹2.25 Cr",
+    "zoya_orders": "43",
+    "zoya_avg_discount": "₹69k",
+    "tanishq_sales": "₹92.9 Cr",
+    "tanishq_orders": "8203",
+    "tanishq_avg_discount": "₹10.6k",
+    "tanishq_returns": "349",
+    "mia_sales": "₹5.1 Cr",
+    "mia_orders": "1652",
+    "mia_avg_discount": "₹2.5k",
+    "mia_returns": "68",
+    "ecom_sales": "₹45 L",
+    "ecom_orders": "102",
+    "ecom_avg_discount": "₹195",
+    "ecom_returns": "zero",
+    "zoya_peak_region": "South 3",
+    "zoya_peak_discount_pct": "12.18%",
+    "ecom_discount_pct": "11.3%",
+    "total_returns": "420",
+    "diamond_returns": "170",
+    "diamond_return_share": "40%",
+    "return_spike_days": "the 13th (22 returns), 25th (27), and 30th (31)",
+    "tanishq_stone_returns": "118",
+    "tanishq_stone_return_share": "28%",
+    "weekend_discount_pct": "5.94%",
+    "weekday_discount_pct": "5.57%",
+    "weekend_txns": "3,356",
+    "weekday_txns": "6,182",
+    "steep_day_1": "Monday",
+    "steep_day_1_pct": "6.40%",
+    "steep_day_1_txns": "1,055",
+    "steep_day_2": "Thursday",
+    "steep_day_2_pct": "6.36%",
+    "steep_day_2_txns": "1,506",
+    "sunday_txns": "1,947",
+    "sunday_discount_pct": "6.03%",
+    "saturday_txns": "1,409",
+    "saturday_discount_pct": "5.84%",
+    "sunday_lift": "40%",
+    "sunday_discount_gap": "0.2%",
+    "discount_trim_impact": "saves ₹15–20 lakh monthly without hurting volumes",
+    "saturday_push_impact": "can add ~500 sales weekly without extra discount",
+}
+
+
+# ===================
+# FINGERPRINTS
+# ===================
+def fingerprint(path):
+    """Change marker for ``path``: ``[mtime_ns, size]``, a list so it round-trips
+    through JSON, or ``None`` if the file is absent."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def daily_files(daily_dir):
+    try:
+        names = sorted(os.listdir(daily_dir))
+    except OSError:
+        return []
+    return [os.path.join(daily_dir, n) for n in names if n.endswith(DAILY_SUFFIXES)]
+
+
+def daily_fingerprint(daily_dir):
+    """Cheap change marker for the daily drop directory."""
+    return tuple((os.path.basename(p), *(fingerprint(p) or ())) for p in daily_files(daily_dir))
+
+
+# ===================
+# CARD TEXT
+# ===================
+def fmt_count(n):
+    return f"{int(n):,}"
+
+
+def fmt_pct(value, digits=2):
+    return f"{value:.{digits}f}%"
+
+
+def fmt_inr(amount):
+    # Indian short scale as used on the cards: ₹2.25 Cr, ₹45 L, ₹10.6k, ₹195
+    for scale, suffix in ((1e7, " Cr"), (1e5, " L"), (1e3, "k")):
+        if abs(amount) >= scale:
+            value = amount / scale
+            return f"₹{value:,.0f}{suffix}" if abs(value) >= 100 else f"₹{value:.3g}{suffix}"
+    return f"₹{amount:.0f}"
+
+
+def ordinal(n):
+    suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
+
+
+def render_bullets(templates, metrics):
+    """Fill the ``{placeholders}`` of each bullet template from ``metrics``."""
+    return [bullet.format_map(metrics) for bullet in templates]
+
+
+def _segment_name(brand, stone):
+    if brand == ALL and stone == ALL:
+        return "All brands"
+    if stone == ALL:
+        return brand
+    if brand == ALL:
+        return f"{stone} (all brands)"
+    return f"{brand} {stone}"
+
+
+def _day_label(iso_date):
+    return datetime.date.fromisoformat(iso_date).strftime("%d %b %Y").lstrip("0")
+
+
+def spike_days_text(spikes, top=3):
+    """The biggest overall spikes, worded for the "Reducing Returns" card."""
+    overall = [s for s in spikes if s["brand"] == ALL and s["stone"] == ALL]
+    if not overall:
+        return None
+    biggest = sorted(sorted(overall, key=lambda s: s["returns"], reverse=True)[:top], key=lambda s: s["date"])
+    parts = [f"{_day_label(biggest[0]['date'])} ({biggest[0]['returns']} returns)"]
+    parts += [f"{_day_label(s['date'])} ({s['returns']})" for s in biggest[1:]]
+    return parts[0] if len(parts) == 1 else ", ".join(parts[:-1]) + ", and " + parts[-1]
+
+
+def spike_module(spikes, limit=MAX_CARDS):
+    """Catalog module with one action card per segment that spiked.
+
+    Segments are ordered by their strongest spike; ``None`` when nothing
+    was flagged.
+    """
+    by_segment = {}
+    for spike in spikes:
+        by_segment.setdefault((spike["brand"], spike["stone"]), []).append(spike)
+    if not by_segment:
+        return None
+    ranked = sorted(by_segment.items(), key=lambda item: max(s["z"] for s in item[1]), reverse=True)
+
+    actions = []
+    for (brand, stone), segment_spikes in ranked[:limit]:
+        name = _segment_name(brand, stone)
+        worst = max(segment_spikes, key=lambda s: s["z"])
+        recent = sorted(segment_spikes, key=lambda s: s["date"])[-3:]
+        days = ", ".join(f"{_day_label(s['date'])} ({s['returns']})" for s in recent)
+        actions.append({
+            "title": f"✦ Return Spike: {name}",
+            "bullets": [
+                f"✦ {name} returns spiked on {len(segment_spikes)} day(s). The sharpest was "
+                f"{_day_label(worst['date'])}: {worst['returns']} returns against about "
+                f"{worst['expected']:.0f} on a typical day.",
+                f"✦ Most recent spikes: {days}. Check which offers ran on these days and "
+                f"review sizing and stone quality for the returned pieces.",
+                "✦ If the offers drove the returns, tighten them or add a try-in-store step "
+                "before the next sale, then watch whether the spike recurs.",
+            ],
+        })
+    return {"name": "Detected Return Spikes", "actions": actions}
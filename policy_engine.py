@@ -0,0 +1,134 @@
+"""What-if engine for discount policies replayed over the bill history.
+
+A policy combines three levers, applied in this order:
+
+    target rate   rows in scope (a brand and/or region) get at most this
+                  discount % of their gross value
+    bill cap      no bill gets more than this total discount
+    split         discount above this threshold becomes a voucher; only the
+                  unredeemed share of the voucher counts as margin saved
+
+For a fixed target rate every cap and split threshold is answered from the
+sorted bill discounts and their suffix sums, so a whole grid costs one sort
+per target rate. Target rates are spread over a process pool when the grid
+and the history are large.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data_store import BILL, BRAND, DISCOUNT, IS_RETURN, REGION, SALES
+
+COLUMNS = [BILL, BRAND, REGION, SALES, DISCOUNT, IS_RETURN]
+
+# Use worker processes only when there is enough work to pay for them
+PARALLEL_MIN_ROWS_X_RATES = 20_000_000
+
+_worker_data = None
+
+
+def prepare(df, brand=None, region=None):
+    """Arrays the engine needs from the transaction table ``df``.
+
+    ``brand``/``region`` restrict which rows the target rate applies to.
+    """
+    sales = df.loc[~df[IS_RETURN]]
+    bill_codes, bills = pd.factorize(sales[BILL])
+    in_scope = np.ones(len(sales), dtype=bool)
+    if brand:
+        in_scope &= (sales[BRAND] == brand).to_numpy()
+    if region:
+        in_scope &= (sales[REGION] == region).to_numpy()
+    discount = sales[DISCOUNT].to_numpy(dtype="float64")
+    return {
+        "bill": bill_codes,
+        "n_bills": len(bills),
+        "discount": discount,
+        "gross": sales[SALES].to_numpy(dtype="float64") + discount,
+        "in_scope": in_scope,
+    }
+
+
+def _excess(sorted_d, suffix, x):
+    # sum(max(d - x, 0)) and count(d > x) for every x, from the sorted values
+    x = np.asarray(x, dtype="float64")
+    if not len(sorted_d):
+        # No bills: nothing exceeds any threshold (and inf * 0 would be nan)
+        return np.zeros_like(x), np.zeros(x.shape, dtype="int64")
+    # S(x) is 0 from the largest value on; clamping also keeps "none" (inf) finite
+    x = np.minimum(x, sorted_d[-1])
+    idx = np.searchsorted(sorted_d, x, side="right")
+    count = len(sorted_d) - idx
+    return suffix[idx] - x * count, count
+
+
+def evaluate_rate(data, rate, caps, splits, redemption):
+    """Margin saved and bills affected for one target rate over caps x splits."""
+    discount = data["discount"]
+    if rate is None or np.isnan(rate):
+        row_discount = discount
+    else:
+        limit = np.where(data["in_scope"], data["gross"] * rate / 100, np.inf)
+        row_discount = np.minimum(discount, limit)
+    rate_saved = discount.sum() - row_discount.sum()
+    rate_hit = np.bincount(data["bill"], weights=(row_discount < discount), minlength=data["n_bills"]) > 0
+
+    bill_discount = np.bincount(data["bill"], weights=row_discount, minlength=data["n_bills"])
+    sorted_d = np.sort(bill_discount)
+    suffix = np.concatenate([np.cumsum(sorted_d[::-1])[::-1], [0.0]])
+    untouched = np.sort(bill_discount[~rate_hit])
+
+    cap, split = np.meshgrid(np.asarray(caps, dtype="float64"), np.asarray(splits, dtype="float64"), indexing="ij")
+    cap, split = cap.ravel(), split.ravel()
+    cap_saved, _ = _excess(sorted_d, suffix, cap)
+    # Voucher share: discount between the split threshold and the cap
+    over_split, _ = _excess(sorted_d, suffix, split)
+    voucher = np.where(cap > split, over_split - cap_saved, 0.0)
+    split_saved = voucher * (1 - redemption)
+
+    threshold = np.minimum(cap, split)
+    bills_affected = rate_hit.sum() + (len(untouched) - np.searchsorted(untouched, threshold, side="right"))
+    return pd.DataFrame({
+        "target_rate": np.nan if rate is None else rate,
+        "cap": cap,
+        "split": split,
+        "rate_saved": rate_saved,
+        "cap_saved": cap_saved,
+        "split_saved": split_saved,
+        "margin_saved": rate_saved + cap_saved + split_saved,
+        "bills_affected": bills_affected,
+    })
+
+
+def _init_worker(data):
+    global _worker_data
+    _worker_data = data
+
+
+def _evaluate_in_worker(args):
+    return evaluate_rate(_worker_data, *args)
+
+
+def evaluate_grid(data, caps, splits, rates=(None,), redemption=0.5, workers=None):
+    """Evaluate every (rate, cap, split) combination; use ``np.inf`` for "none".
+
+    Returns one row per policy with the margin saved by each lever and the
+    number of bills the policy changes.
+    """
+    rates = list(rates)
+    jobs = [(rate, caps, splits, redemption) for rate in rates]
+    parallel = len(rates) > 1 and len(data["discount"]) * len(rates) >= PARALLEL_MIN_ROWS_X_RATES
+    if parallel:
+        workers = workers or min(len(rates), os.cpu_count() or 1)
+    if parallel and workers > 1:
+        # Spawned rather than forked: forking the threaded Streamlit server can
+        # copy a lock some other thread holds and hang the worker
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(data,)) as pool:
+            frames = list(pool.map(_evaluate_in_worker, jobs))
+    else:
+        frames = [evaluate_rate(data, *job) for job in jobs]
+    return pd.concat(frames, ignore_index=True)
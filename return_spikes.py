@@ -0,0 +1,203 @@
+"""Streaming detector for spikes in the daily returns series.
+
+Returns are counted per day for every brand x stone category segment, plus
+each brand and stone category on its own and the overall total. Each segment
+keeps an exponentially weighted level and mean absolute deviation, so a new
+day costs O(1) per segment however long the history is. A day is flagged when
+its robust z-score against the segment's running level clears the threshold.
+Spiking days are winsorized before they update the level, so one sale day
+does not hide the next.
+"""
+import datetime
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_store import BRAND, CACHE_DIR, DATE, IS_RETURN, STONE, refresh_incremental
+from page_helpers import ALL
+
+logger = logging.getLogger(__name__)
+
+SOURCE_COLUMNS = [DATE, BRAND, STONE, IS_RETURN]
+STATE_PATH = os.path.join(CACHE_DIR, "return_spikes.parquet")
+
+ALPHA = 0.1          # weight of the newest day in the running level and spread
+THRESHOLD = 4.0      # robust z-score that counts as a spike
+WARMUP_DAYS = 14     # days a segment is observed before it can be flagged
+MIN_RETURNS = 5      # ignore "spikes" of a handful of returns
+MIN_SCALE = 1.0      # spread floor, in returns, for quiet segments
+CLIP = 3.0           # spread multiples a day may move the level by
+# Mean absolute deviation to standard deviation, for normally distributed noise
+MAD_TO_STD = 1.2533
+
+
+# ===================
+# DETECTOR
+# ===================
+class SpikeDetector:
+    """Running per-segment return statistics, one array slot per segment.
+
+    Segments are ``(brand, stone)`` pairs; ``ALL`` in either place is the
+    total over that dimension.
+    """
+
+    def __init__(self, alpha=ALPHA, threshold=THRESHOLD, warmup=WARMUP_DAYS, min_returns=MIN_RETURNS):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.min_returns = min_returns
+        self.segments = []
+        self._index = {}
+        self.days = np.zeros(0, dtype="int64")
+        self.level = np.zeros(0)
+        self.spread = np.zeros(0)
+        self.n_days = 0
+        self.last_date = None
+
+    def _slots(self, segments):
+        new = [s for s in segments if s not in self._index]
+        if new:
+            for segment in new:
+                self._index[segment] = len(self.segments)
+                self.segments.append(segment)
+            # A new segment had zero returns on every earlier day, so it starts
+            # from a zero level that has already seen those days; only the
+            # segments of the very first day are seeded from their first count
+            self.days = np.concatenate([self.days, np.full(len(new), self.n_days, dtype="int64")])
+            self.level = np.concatenate([self.level, np.zeros(len(new))])
+            self.spread = np.concatenate([self.spread, np.zeros(len(new))])
+        return np.fromiter((self._index[s] for s in segments), dtype="int64", count=len(segments))
+
+    def update(self, date, counts):
+        """Fold in one day of ``{segment: returns}`` and return that day's spikes.
+
+        Segments missing from ``counts`` had no returns that day.
+        """
+        slots = self._slots(list(counts))
+        x = np.zeros(len(self.segments))
+        x[slots] = list(counts.values())
+
+        scale = np.maximum(self.spread * MAD_TO_STD, MIN_SCALE)
+        z = (x - self.level) / scale
+        ready = self.days >= self.warmup
+        flagged = np.flatnonzero(ready & (z >= self.threshold) & (x >= self.min_returns))
+        spikes = [
+            {
+                "date": date.isoformat(),
+                "brand": self.segments[i][0],
+                "stone": self.segments[i][1],
+                "returns": int(x[i]),
+                "expected": round(float(self.level[i]), 2),
+                "z": round(float(z[i]), 2),
+            }
+            for i in flagged
+        ]
+
+        x = np.where(ready, np.minimum(x, self.level + CLIP * scale), x)
+        first = self.days == 0
+        deviation = np.abs(x - self.level)
+        self.level = np.where(first, x, self.level + self.alpha * (x - self.level))
+        self.spread = np.where(first, 0.0, self.spread + self.alpha * (deviation - self.spread))
+        self.days += 1
+        self.n_days += 1
+        self.last_date = date
+        return spikes
+
+    def to_frame(self):
+        return pd.DataFrame({
+            BRAND: [s[0] for s in self.segments],
+            STONE: [s[1] for s in self.segments],
+            "days": self.days,
+            "level": self.level,
+            "spread": self.spread,
+        })
+
+    @classmethod
+    def from_frame(cls, frame, last_date):
+        detector = cls()
+        detector._slots(list(zip(frame[BRAND], frame[STONE])))
+        detector.days = frame["days"].to_numpy(dtype="int64")
+        detector.level = frame["level"].to_numpy(dtype="float64")
+        detector.spread = frame["spread"].to_numpy(dtype="float64")
+        detector.n_days = int(detector.days.max()) if len(detector.days) else 0
+        detector.last_date = datetime.date.fromisoformat(last_date) if last_date else None
+        return detector
+
+
+def daily_counts(df):
+    """``{date: {segment: returns}}`` for every day with transactions in ``df``.
+
+    Days that had sales but no returns map to an empty dict.
+    """
+    dates = df[DATE].dt.normalize()
+    returns = df.loc[df[IS_RETURN].astype(bool)]
+    frame = pd.DataFrame({
+        DATE: dates[returns.index],
+        BRAND: returns[BRAND].astype(str),
+        STONE: returns[STONE].astype(str),
+    })
+    by_segment = frame.groupby([DATE, BRAND, STONE], observed=True).size().rename("n").reset_index()
+    by_brand = by_segment.groupby([DATE, BRAND], as_index=False)["n"].sum().assign(**{STONE: ALL})
+    by_stone = by_segment.groupby([DATE, STONE], as_index=False)["n"].sum().assign(**{BRAND: ALL})
+    total = by_segment.groupby(DATE, as_index=False)["n"].sum().assign(**{BRAND: ALL, STONE: ALL})
+    counts = pd.concat([by_segment, by_brand, by_stone, total], ignore_index=True)
+
+    days = {day.date(): {} for day in sorted(dates.unique())}
+    for day, group in counts.groupby(DATE):
+        days[day.date()] = dict(zip(zip(group[BRAND], group[STONE]), group["n"].tolist()))
+    return days
+
+
+def scan(detector, df):
+    """Feed the days of ``df`` after the detector's last day; return the spikes."""
+    spikes = []
+    skipped = 0
+    for day, counts in daily_counts(df).items():
+        if detector.last_date is not None and day <= detector.last_date:
+            skipped += 1
+            continue
+        spikes.extend(detector.update(day, counts))
+    if skipped:
+        logger.warning("Skipped %d day(s) already folded into the return-spike state", skipped)
+    return spikes
+
+
+# ===================
+# PERSISTENCE
+# ===================
+def _manifest_path(state_path):
+    return os.path.splitext(state_path)[0] + ".json"
+
+
+def load_state(manifest, state_path=STATE_PATH):
+    """The saved ``(detector, spikes)``; the spikes and last day live in the manifest."""
+    frame = pd.read_parquet(state_path)
+    return SpikeDetector.from_frame(frame, manifest.get("last_date")), manifest.get("spikes", [])
+
+
+def save_state(detector, spikes, state_path=STATE_PATH):
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    tmp_path = state_path + ".tmp"
+    detector.to_frame().to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, state_path)
+    return {"spikes": spikes, "last_date": detector.last_date.isoformat() if detector.last_date else None}
+
+
+def refresh(history_path, daily_dir, state_path=STATE_PATH):
+    """Bring the detector up to date and return every spike flagged so far.
+
+    New daily files are streamed through the saved detector, and a changed
+    history or edited daily file starts over (see
+    ``data_store.refresh_incremental``).
+    """
+    (_, spikes), _ = refresh_incremental(
+        history_path, daily_dir, _manifest_path(state_path),
+        start=lambda: (SpikeDetector(), []),
+        fold=lambda state, df: (state[0], state[1] + scan(state[0], df)),
+        load=lambda manifest: load_state(manifest, state_path),
+        save=lambda state: save_state(*state, state_path),
+        columns=SOURCE_COLUMNS,
+    )
+    return spikes
@@ -0,0 +1,246 @@
+"""Customer segmentation (RFM plus spend tiers) over the transaction history.
+
+The history is streamed in chunks (see ``data_store.iter_chunks``) and folded
+into per-customer state held in flat NumPy arrays: first and last purchase
+day, number of bills, net spend and returns. The chunks come in date order,
+so a bill split across chunks can only be on the last day of the previous
+chunk; only these arrays and the bill hashes of that one day live in memory,
+so the history itself can be larger than RAM.
+
+Once streamed, every customer gets recency/frequency/monetary scores (1-5 by
+quintile), an RFM segment and a spend tier. Membership is written to a
+Parquet artifact next to a manifest holding the per-segment counts, which is
+all the app needs to read to show them.
+"""
+import datetime
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_store import (
+    BILL, CACHE_DIR, CUSTOMER, DATE, IS_RETURN, ROW_GROUP_SIZE, SALES, iter_chunks, read_manifest, write_manifest,
+)
+from page_helpers import fingerprint
+
+logger = logging.getLogger(__name__)
+
+SOURCE_COLUMNS = [DATE, BILL, CUSTOMER, SALES, IS_RETURN]
+ARTIFACT_PATH = os.path.join(CACHE_DIR, "customer_segments.parquet")
+
+# Net spend tiers; a customer is in tier i when SPEND_EDGES[i - 1] <= spend < SPEND_EDGES[i]
+SPEND_EDGES = [50_000, 200_000, 500_000]
+SPEND_TIERS = ["Under ₹50k", "₹50k–2L", "₹2L–5L", "₹5L+"]
+HIGH_VALUE_TIER = SPEND_TIERS[-1]
+
+# First matching rule wins; scores are 1 (worst) to 5 (best)
+SEGMENT_RULES = [
+    ("Champions", lambda r, f, m: (r >= 4) & (f >= 4) & (m >= 4)),
+    ("Loyal", lambda r, f, m: (r >= 3) & (f >= 4)),
+    ("Big Spenders", lambda r, f, m: (r >= 3) & (m >= 4)),
+    ("New", lambda r, f, m: (r >= 4) & (f <= 1)),
+    ("At Risk", lambda r, f, m: (r <= 2) & ((f >= 3) | (m >= 4))),
+    ("Hibernating", lambda r, f, m: r <= 2),
+]
+OTHER_SEGMENT = "Needs Attention"
+
+_NO_DAY = np.iinfo("int32").min
+
+
+# ===================
+# STREAMING STATE
+# ===================
+class CustomerState:
+    """Per-customer running totals, one slot per customer in each array."""
+
+    def __init__(self, capacity=1024):
+        self.ids = []
+        self._index = {}
+        self.first_day = np.full(capacity, np.iinfo("int32").max, dtype="int32")
+        self.last_day = np.full(capacity, _NO_DAY, dtype="int32")
+        self.bills = np.zeros(capacity, dtype="int32")
+        self.returns = np.zeros(capacity, dtype="int32")
+        self.spend = np.zeros(capacity, dtype="float64")
+        # Sorted hashes of the (customer, bill) pairs counted on the latest day
+        self._last_day = _NO_DAY
+        self._last_day_bills = np.zeros(0, dtype="uint64")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _grow(self, needed):
+        capacity = len(self.spend)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        for name, fill in (("first_day", np.iinfo("int32").max), ("last_day", _NO_DAY), ("bills", 0),
+                           ("returns", 0), ("spend", 0.0)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _slots(self, ids):
+        codes, uniques = pd.factorize(ids)
+        slot_of = np.empty(len(uniques), dtype="int64")
+        for i, customer in enumerate(uniques.tolist()):
+            slot = self._index.get(customer)
+            if slot is None:
+                slot = self._index[customer] = len(self.ids)
+                self.ids.append(customer)
+            slot_of[i] = slot
+        self._grow(len(self.ids))
+        return slot_of[codes]
+
+    def update(self, chunk):
+        """Fold one chunk of transaction rows into the state.
+
+        Chunks must come in date order; a bill is one bill number on one day.
+        """
+        chunk = chunk.loc[chunk[CUSTOMER].notna()]
+        if not len(chunk):
+            return
+        slots = self._slots(chunk[CUSTOMER].to_numpy())
+        is_return = chunk[IS_RETURN].to_numpy(dtype=bool)
+        sales = chunk[SALES].to_numpy(dtype="float64")
+        np.add.at(self.spend, slots, np.where(is_return, -sales, sales))
+        np.add.at(self.returns, slots[is_return], 1)
+
+        sold = ~is_return
+        slots, days = slots[sold], chunk[DATE].to_numpy()[sold].astype("datetime64[D]").astype("int32")
+        np.minimum.at(self.first_day, slots, days)
+        np.maximum.at(self.last_day, slots, days)
+
+        if not len(days):
+            return
+        if days.min() < self._last_day:
+            raise ValueError("chunks must be in date order")
+        # A bill counts once for its customer however its rows are spread
+        # over chunks; an earlier chunk can only share the current last day
+        bills = chunk.loc[sold, [CUSTOMER, BILL]].assign(day=days)
+        pairs = pd.util.hash_pandas_object(bills, index=False).to_numpy()
+        pairs, first_row = np.unique(pairs, return_index=True)
+        new = ~((days[first_row] == self._last_day) & np.isin(pairs, self._last_day_bills, assume_unique=True))
+        np.add.at(self.bills, slots[first_row[new]], 1)
+
+        last_day = days.max()
+        last_pairs = pairs[days[first_row] == last_day]
+        if last_day == self._last_day:
+            last_pairs = np.union1d(self._last_day_bills, last_pairs)
+        self._last_day, self._last_day_bills = last_day, last_pairs
+
+    def frame(self):
+        """One row per customer with RFM scores, segment and spend tier."""
+        n = len(self)
+        last_day = self.last_day[:n]
+        bought = last_day != _NO_DAY
+        as_of = last_day[bought].max() if bought.any() else 0
+        df = pd.DataFrame({
+            CUSTOMER: self.ids,
+            "first_purchase": np.where(bought, self.first_day[:n], _NO_DAY),
+            "last_purchase": last_day,
+            "recency_days": np.where(bought, as_of - last_day, -1),
+            "bills": self.bills[:n],
+            "returns": self.returns[:n],
+            "net_spend": self.spend[:n],
+        })
+        for col in ("first_purchase", "last_purchase"):
+            df[col] = pd.to_datetime(df[col].where(bought).astype("float64"), unit="D")
+
+        r = _score(-df["recency_days"].where(bought).to_numpy(dtype="float64"))
+        f = _score(df["bills"].to_numpy(dtype="float64"))
+        m = _score(df["net_spend"].to_numpy(dtype="float64"))
+        segment = np.full(n, OTHER_SEGMENT, dtype=object)
+        unassigned = np.ones(n, dtype=bool)
+        for name, rule in SEGMENT_RULES:
+            hit = unassigned & rule(r, f, m) & bought
+            segment[hit] = name
+            unassigned &= ~hit
+        df["r"], df["f"], df["m"] = r, f, m
+        df["segment"] = segment
+        df["spend_tier"] = np.array(SPEND_TIERS)[np.searchsorted(SPEND_EDGES, df["net_spend"].to_numpy(), side="right")]
+        df.attrs["as_of"] = (datetime.date(1970, 1, 1) + datetime.timedelta(days=int(as_of))).isoformat()
+        return df
+
+
+def _score(values):
+    # Quintile scores 1-5 by rank; missing values score 1
+    scores = np.ones(len(values), dtype="int8")
+    present = ~np.isnan(values)
+    if present.any():
+        ranks = pd.Series(values[present]).rank(method="first", pct=True).to_numpy()
+        scores[present] = np.ceil(ranks * 5).clip(1, 5)
+    return scores
+
+
+def segment_customers(path, chunk_rows=ROW_GROUP_SIZE):
+    """Stream the source at ``path`` and return the customer-level frame."""
+    state = CustomerState()
+    for chunk in iter_chunks(path, SOURCE_COLUMNS, chunk_rows, ordered=True):
+        if CUSTOMER not in chunk:
+            logger.warning("%s has no %s column; skipping customer segmentation", path, CUSTOMER)
+            return None
+        state.update(chunk)
+    return state.frame()
+
+
+# ===================
+# ARTIFACT
+# ===================
+def _manifest_path(artifact_path):
+    return os.path.splitext(artifact_path)[0] + ".json"
+
+
+def summarize(df):
+    spend = df.groupby("spend_tier")["net_spend"].agg(["size", "sum"]).reindex(SPEND_TIERS, fill_value=0)
+    high_value = df[df["spend_tier"] == HIGH_VALUE_TIER]
+    total_spend = df["net_spend"].clip(lower=0).sum()
+    return {
+        "as_of": df.attrs["as_of"],
+        "customers": len(df),
+        "tiers": {tier: {"customers": int(row["size"]), "spend": float(row["sum"])} for tier, row in spend.iterrows()},
+        "segments": {str(k): int(v) for k, v in df["segment"].value_counts().items()},
+        "high_value": {
+            "customers": len(high_value),
+            "spend": float(high_value["net_spend"].sum()),
+            "spend_share": float(high_value["net_spend"].sum() / total_spend) if total_spend else 0.0,
+            "segments": {str(k): int(v) for k, v in high_value["segment"].value_counts().items()},
+        },
+    }
+
+
+def refresh(path, artifact_path=ARTIFACT_PATH):
+    """Rebuild the segment artifact if ``path`` changed; return its summary.
+
+    Returns ``None`` when the source has no customer column.
+    """
+    source = fingerprint(path)
+    manifest = read_manifest(_manifest_path(artifact_path))
+    if manifest and manifest.get("source") == source and os.path.exists(artifact_path):
+        return manifest["summary"]
+
+    logger.info("Segmenting customers in %s", path)
+    df = segment_customers(path)
+    if df is None:
+        return None
+    os.makedirs(os.path.dirname(artifact_path) or ".", exist_ok=True)
+    tmp_path = artifact_path + ".tmp"
+    out = df.copy()
+    out[CUSTOMER] = out[CUSTOMER].astype(str)
+    out.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, artifact_path)
+    summary = summarize(df)
+    write_manifest(_manifest_path(artifact_path), {"source": source, "summary": summary})
+    return summary
+
+
+def load_members(artifact_path=ARTIFACT_PATH, spend_tier=None, segment=None):
+    """Members of a tier and/or segment, highest spend first (for target lists)."""
+    filters = []
+    if spend_tier:
+        filters.append(("spend_tier", "==", spend_tier))
+    if segment:
+        filters.append(("segment", "==", segment))
+    df = pd.read_parquet(artifact_path, filters=filters or None)
+    return df.sort_values("net_spend", ascending=False, ignore_index=True)
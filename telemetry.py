@@ -0,0 +1,277 @@
+"""Opt-in, in-process performance telemetry for the app.
+
+``Telemetry`` keeps latency histograms and counters in memory and can
+export them two ways: Prometheus text on a local HTTP endpoint, or a
+rotating log with one JSON snapshot per interval. ``SamplingProfiler``
+periodically samples the app threads and aggregates their stacks as folded
+stacks (the input format of flamegraph tools), to find hot paths under load.
+
+Everything here is standard library only; when telemetry is off the app
+never creates these objects.
+"""
+import collections
+import contextlib
+import http.server
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "nextaction_"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RUNS_PER_SESSION_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+MAX_SESSIONS = 10_000
+
+
+def _label_text(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return float("nan")
+        target = q * self.count
+        seen = 0
+        for bound, n in zip((*self.buckets, float("inf")), self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class Telemetry:
+    """Thread-safe registry of counters and histograms.
+
+    Metric names are given without the ``nextaction_`` prefix; labels are
+    keyword arguments, e.g. ``observe("section_seconds", 0.2, section="header")``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = collections.defaultdict(float)
+        self._histograms = {}
+        self._session_runs = collections.OrderedDict()
+        self.started = time.time()
+
+    # -------------------
+    # Recording
+    # -------------------
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def record_session_run(self, session_id):
+        self.inc("script_runs_total")
+        with self._lock:
+            runs = self._session_runs.pop(session_id, 0) + 1
+            self._session_runs[session_id] = runs
+            if len(self._session_runs) > MAX_SESSIONS:
+                self._session_runs.popitem(last=False)
+
+    # -------------------
+    # Export
+    # -------------------
+    def _runs_per_session(self):
+        histogram = Histogram(RUNS_PER_SESSION_BUCKETS)
+        for runs in self._session_runs.values():
+            histogram.observe(runs)
+        return histogram
+
+    def prometheus(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            histograms.append((("runs_per_session", ()), self._runs_per_session()))
+            lines = []
+            typed = set()
+            for (name, labels), value in counters:
+                if name not in typed:
+                    lines.append(f"# TYPE {PREFIX}{name} counter")
+                    typed.add(name)
+                lines.append(f"{PREFIX}{name}{_label_text(labels)} {value:g}")
+            for (name, labels), h in histograms:
+                if name not in typed:
+                    lines.append(f"# TYPE {PREFIX}{name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, n in zip((*h.buckets, "+Inf"), h.counts):
+                    cumulative += n
+                    lines.append(f"{PREFIX}{name}_bucket{_label_text(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{PREFIX}{name}_sum{_label_text(labels)} {h.sum:g}")
+                lines.append(f"{PREFIX}{name}_count{_label_text(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Counters and histogram summaries as plain data (for logs and the UI)."""
+        with self._lock:
+            counters = {
+                f"{name}{_label_text(labels)}": value for (name, labels), value in sorted(self._counters.items())
+            }
+            histograms = {
+                f"{name}{_label_text(labels)}": {
+                    "count": h.count,
+                    "mean": h.sum / h.count if h.count else float("nan"),
+                    "p50": h.quantile(0.5),
+                    "p95": h.quantile(0.95),
+                    "p99": h.quantile(0.99),
+                }
+                for (name, labels), h in sorted(self._histograms.items(), key=lambda item: item[0])
+            }
+            sessions = len(self._session_runs)
+        return {"time": time.time(), "counters": counters, "histograms": histograms, "sessions": sessions}
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve ``/metrics`` on a local port from a daemon thread.
+
+        Returns the server, or ``None`` when the port cannot be bound (e.g.
+        another worker already serves it); the app keeps running without it.
+        """
+        telemetry = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            server = http.server.ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            logger.warning("Cannot serve metrics on %s:%d (%s); continuing without the endpoint", host, port, e)
+            return None
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info("Serving metrics on http://%s:%d/metrics", host, server.server_port)
+        return server
+
+    def log_every(self, path, interval=60.0, max_bytes=5 * 2**20, backup_count=5):
+        """Append a JSON snapshot to a rotating log at ``path`` every ``interval`` seconds."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                record = logging.LogRecord("telemetry", logging.INFO, path, 0, json.dumps(self.snapshot()), None, None)
+                handler.emit(record)
+
+        threading.Thread(target=run, name="metrics-log", daemon=True).start()
+        return stop
+
+
+class SamplingProfiler:
+    """Statistical profiler sampling thread stacks at a fixed interval.
+
+    Only threads whose name starts with one of ``thread_prefixes`` are
+    sampled; by default the Streamlit script threads, since the server's and
+    workers' idle waits would otherwise dominate. Samples are
+    kept as folded stacks, ``outer;...;inner count``, which flamegraph.pl,
+    speedscope and similar tools read directly.
+    """
+
+    def __init__(self, interval=0.01, max_depth=64, thread_prefixes=("ScriptRunner",)):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.thread_prefixes = tuple(thread_prefixes)
+        self.samples = collections.Counter()
+        self._lock = threading.Lock()
+        self._stop = None
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self.running:
+            self._stop.set()
+            self._thread.join()
+
+    def clear(self):
+        with self._lock:
+            self.samples.clear()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if not names.get(thread_id, "").startswith(self.thread_prefixes):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                with self._lock:
+                    self.samples[";".join(reversed(stack))] += 1
+
+    def _snapshot(self):
+        with self._lock:
+            return self.samples.copy()
+
+    def folded(self):
+        return "".join(f"{stack} {n}\n" for stack, n in self._snapshot().most_common())
+
+    def top(self, n=20):
+        """The ``n`` functions seen most often at the top of a sampled stack."""
+        leaves = collections.Counter()
+        for stack, count in self._snapshot().items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [(func, count, count / total) for func, count in leaves.most_common(n)]
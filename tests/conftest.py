@@ -0,0 +1,54 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The app modules live at the repository root; the SMTP stub with the benchmarks
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+from data_store import (  # noqa: E402
+    BILL, BRAND, CUSTOMER, DATE, DISCOUNT, DISCOUNT_PCT, IS_RETURN, MAKING_CHARGES, REGION, SALES, STONE,
+    WEIGHT_BAND, WEIGHT_BANDS,
+)
+
+BRANDS = ["Tanishq", "Mia", "Zoya", "CaratLane"]
+REGIONS = ["North", "South", "East", "West"]
+# Stone codes in mixed case, as the sources spell them
+STONES = ["Dia", "gis", "PLN"]
+
+
+def make_transactions(n, seed=0, start="2024-01-01", days=60):
+    """Synthetic transaction rows in the shape ``data_store.load_frame`` returns."""
+    rng = np.random.default_rng(seed)
+    sales = rng.uniform(5_000, 300_000, n).round(2)
+    discount_pct = rng.uniform(0, 12, n).round(2)
+    making_charges = rng.uniform(1_000, 150_000, n).round(2)
+    making_charges[rng.random(n) < 0.05] = np.nan
+    # Times of day too, so anything grouped per day has to normalize them
+    timestamps = (
+        pd.Timestamp(start)
+        + pd.to_timedelta(rng.integers(0, days, n), unit="D")
+        + pd.to_timedelta(rng.integers(0, 86_400, n), unit="s")
+    )
+    return pd.DataFrame({
+        DATE: timestamps,
+        BILL: [f"B{b:05d}" for b in rng.integers(0, n // 3 + 1, n)],
+        CUSTOMER: [f"C{c:04d}" for c in rng.integers(0, n // 10 + 1, n)],
+        BRAND: rng.choice(BRANDS, n),
+        REGION: rng.choice(REGIONS, n),
+        STONE: rng.choice(STONES, n),
+        WEIGHT_BAND: rng.choice(WEIGHT_BANDS, n),
+        MAKING_CHARGES: making_charges,
+        SALES: sales,
+        DISCOUNT: (sales * discount_pct / 100).round(2),
+        DISCOUNT_PCT: discount_pct,
+        IS_RETURN: rng.random(n) < 0.1,
+    })
+
+
+@pytest.fixture
+def transactions():
+    return make_transactions(2_000)
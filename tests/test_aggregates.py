@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+from aggregates import (
+    BILL_EDGES, BILLS, DAILY, MC_BUCKET, MC_UNKNOWN, TABLE_KEYS, aggregate, bills_over, empty_state, merge,
+)
+from data_store import BILL, DATE, DISCOUNT, IS_RETURN, MAKING_CHARGES
+
+
+def assert_states_equal(left, right):
+    for name in TABLE_KEYS:
+        pd.testing.assert_frame_equal(left[name].sort_index(), right[name].sort_index(), check_like=True)
+
+
+def test_daily_drops_merge_to_the_aggregate_of_everything(transactions):
+    # History up to the day before, then the last day arriving in two files
+    day = transactions[DATE].dt.normalize()
+    history = transactions[day < day.max()]
+    last_day = transactions[day == day.max()]
+    first, second = last_day.iloc[::2], last_day.iloc[1::2]
+    state = merge(merge(aggregate(history), aggregate(first)), aggregate(second))
+    assert_states_equal(state, aggregate(transactions))
+
+
+def test_merge_with_empty_state_is_identity(transactions):
+    state = aggregate(transactions)
+    assert_states_equal(merge(empty_state(), state), state)
+    assert_states_equal(merge(state, empty_state()), state)
+
+
+def test_bills_over_each_edge(transactions):
+    sold = transactions[~transactions[IS_RETURN]]
+    totals = sold.groupby([sold[DATE].dt.normalize(), BILL])[DISCOUNT].sum()
+    state = aggregate(transactions)
+    for threshold in BILL_EDGES:
+        assert bills_over(state, threshold) == (totals > threshold).sum()
+    with pytest.raises(ValueError):
+        bills_over(state, 60_000)
+
+
+def test_only_the_latest_days_bills_stay_exact(transactions):
+    bills = aggregate(transactions)[BILLS]
+    dates = bills.index.get_level_values(DATE)
+    assert (dates == transactions[DATE].dt.normalize().max()).all()
+
+
+def test_daily_counts_sold_items_per_day(transactions):
+    daily = aggregate(transactions)[DAILY]
+    sold = transactions[~transactions[IS_RETURN]]
+    assert daily["txns"].sum() == len(sold)
+    assert daily.index.get_level_values(0).nunique() == sold[DATE].dt.normalize().nunique()
+
+
+def test_missing_making_charges_get_their_own_bucket(transactions):
+    item = aggregate(transactions)["item"]
+    unknown = item.xs(MC_UNKNOWN, level=MC_BUCKET)["count"].sum()
+    assert unknown == transactions[MAKING_CHARGES].isna().sum()
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from aggregates import WEEKDAY
+from cube import Cube
+from data_store import BRAND, DATE, DISCOUNT_PCT, IS_RETURN, REGION, SALES, STONE, WEIGHT_BAND
+
+
+@pytest.fixture
+def cube(transactions):
+    return Cube.from_frame(transactions)
+
+
+def test_count_by_brand(cube, transactions):
+    sold = transactions[~transactions[IS_RETURN]]
+    assert cube.query("count", by=BRAND, is_return=False) == sold[BRAND].value_counts().to_dict()
+
+
+def test_mean_over_a_list_of_weekdays(cube, transactions):
+    weekend = transactions[transactions[DATE].dt.dayofweek.isin([5, 6]) & ~transactions[IS_RETURN]]
+    answer = cube.query("mean", DISCOUNT_PCT, weekday=[5, 6], is_return=False)
+    assert answer == pytest.approx(weekend[DISCOUNT_PCT].mean())
+
+
+def test_sum_and_std_drill_down(cube, transactions):
+    returns = transactions[transactions[IS_RETURN] & (transactions[BRAND] == "Zoya")]
+    sums = cube.query("sum", SALES, by=STONE, brand="Zoya", is_return=True)
+    stds = cube.query("std", SALES, by=STONE, brand="Zoya", is_return=True)
+    assert sums == pytest.approx(returns.groupby(STONE)[SALES].sum().to_dict())
+    assert stds == pytest.approx(returns.groupby(STONE)[SALES].std(ddof=0).to_dict())
+
+
+def test_weight_band_count(cube, transactions):
+    assert cube.query("count", by=WEIGHT_BAND) == transactions[WEIGHT_BAND].value_counts().to_dict()
+
+
+def test_empty_selection(cube):
+    assert cube.query("count", brand="No Such Brand") == 0
+    assert np.isnan(cube.query("mean", SALES, brand="No Such Brand"))
+    assert cube.query("count", by=REGION, brand="No Such Brand") == {}
+
+
+def test_brand_region_on_a_weekday(cube, transactions):
+    # "Average discount % for Zoya in South on Mondays"
+    sold = transactions[~transactions[IS_RETURN]]
+    zoya_south = sold[(sold[BRAND] == "Zoya") & (sold[REGION] == "South")]
+    mondays = zoya_south[zoya_south[DATE].dt.dayofweek == 0]
+    assert len(mondays)
+    answer = cube.query("mean", DISCOUNT_PCT, brand="Zoya", region="South", weekday=0, is_return=False)
+    assert answer == pytest.approx(mondays[DISCOUNT_PCT].mean())
+    by_weekday = cube.query("count", by=WEEKDAY, brand="Zoya", region="South", is_return=False)
+    assert by_weekday == zoya_south[DATE].dt.dayofweek.value_counts().to_dict()
+
+
+def test_rejects_unknown_stat(cube):
+    with pytest.raises(ValueError):
+        cube.query("median", SALES)
@@ -0,0 +1,13 @@
+from data_store import BRAND, LOAD_REPORTS, load_frame
+
+
+def test_load_reports_cold_then_cached(transactions, tmp_path):
+    source = str(tmp_path / "sales.csv")
+    transactions.to_csv(source, index=False)
+    cache_dir = str(tmp_path / "cache")
+    cold = load_frame(source, cache_dir=cache_dir)
+    cached = load_frame(source, [BRAND], cache_dir=cache_dir)
+    assert [r["cold"] for r in list(LOAD_REPORTS)[-2:]] == [True, False]
+    assert LOAD_REPORTS[-1] is cached.attrs["load_report"]
+    assert cold.attrs["load_report"]["rows"] == cached.attrs["load_report"]["rows"] == len(transactions)
+    assert list(cached.columns) == [BRAND]
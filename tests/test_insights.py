@@ -0,0 +1,30 @@
+from aggregates import aggregate
+from data_store import BRAND, DISCOUNT_PCT, IS_RETURN, REGION, STONE, normalize
+from insights import DEFAULT_METRICS, MID_RANGE_STONES, compute_metrics
+
+
+def metrics_of(df):
+    return compute_metrics(aggregate(df))
+
+
+def test_brand_and_stone_codes_match_in_any_case(transactions):
+    df = normalize(transactions)
+    metrics = metrics_of(df)
+    returns = df[df[IS_RETURN]]
+    tanishq = returns[returns[BRAND] == "TANISHQ"]
+    assert metrics["tanishq_returns"] == str(len(tanishq))
+    assert metrics["tanishq_stone_returns"] == str(tanishq[STONE].isin(MID_RANGE_STONES).sum())
+    assert metrics["tanishq_stone_returns"] != "0"
+
+    sold = df[~df[IS_RETURN] & (df[BRAND] == "ZOYA")]
+    by_region = sold.groupby(REGION, observed=True)[DISCOUNT_PCT].mean()
+    assert metrics["zoya_peak_region"] == by_region.idxmax()
+    assert metrics["zoya_peak_discount_pct"] == f"{by_region.max():.2f}%"
+
+
+def test_missing_brand_keeps_its_defaults(transactions):
+    df = normalize(transactions)
+    metrics = metrics_of(df[~df[BRAND].isin(["TANISHQ", "ZOYA"])])
+    for key in ("tanishq_stone_returns", "tanishq_stone_return_share", "zoya_peak_region", "zoya_peak_discount_pct"):
+        assert metrics[key] == DEFAULT_METRICS[key]
+    assert metrics["total_returns"] != DEFAULT_METRICS["total_returns"]
@@ -0,0 +1,82 @@
+import datetime
+
+import pytest
+
+from ledger import COMPLETED, FAILED, SENT, SUPERSEDED, Ledger
+
+TODAY = datetime.date(2024, 11, 4)
+DEADLINE = TODAY + datetime.timedelta(days=7)
+RECIPIENTS = ["team@example.com"]
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = Ledger(str(tmp_path / "ledger.db"))
+    yield ledger
+    ledger.close()
+
+
+def open_counts(ledger, today=TODAY):
+    ledger.flush()
+    return {row["team"]: row["open_assignments"] for row in ledger.open_per_team(today)}
+
+
+def test_sent_assignment_stays_open_until_completed(ledger):
+    ledger.record("job-1", ["Push Saturday offers"], "Sales", RECIPIENTS, DEADLINE)
+    ledger.update_status("job-1", SENT)
+    assert open_counts(ledger) == {"Sales": 1}
+    assert [row["action"] for row in ledger.sent_since(TODAY)] == ["Push Saturday offers"]
+
+    ledger.complete("Push Saturday offers", "Sales", DEADLINE)
+    assert open_counts(ledger) == {}
+    assert ledger.history()[0]["status"] == COMPLETED
+    # Still listed as sent
+    assert len(ledger.sent_since(TODAY)) == 1
+
+
+def test_assignment_closes_at_its_deadline(ledger):
+    ledger.record("job-1", ["Push Saturday offers"], "Sales", RECIPIENTS, DEADLINE)
+    assert open_counts(ledger, DEADLINE) == {"Sales": 1}
+    assert open_counts(ledger, DEADLINE + datetime.timedelta(days=1)) == {}
+
+
+def test_resend_supersedes_the_failed_row(ledger):
+    ledger.record("job-1", ["Push Saturday offers", "Trim Monday discount"], "Sales", RECIPIENTS, DEADLINE,
+                  kind="digest")
+    ledger.update_status("job-1", FAILED)
+    ledger.record("job-2", ["Push Saturday offers"], "Sales", RECIPIENTS, DEADLINE)
+    ledger.update_status("job-2", SENT)
+    ledger.flush()
+    statuses = {(row["action"], row["status"]) for row in ledger.history()}
+    assert statuses == {
+        ("Push Saturday offers", SUPERSEDED),
+        ("Trim Monday discount", FAILED),
+        ("Push Saturday offers", SENT),
+    }
+    # The failed digest row that was not resent is still open
+    assert open_counts(ledger) == {"Sales": 2}
+
+
+def test_status_before_record_is_kept(ledger):
+    ledger.update_status("job-1", SENT)
+    ledger.record("job-1", ["Push Saturday offers"], "Sales", RECIPIENTS, DEADLINE)
+    ledger.flush()
+    assert ledger.history()[0]["status"] == SENT
+
+
+def test_late_delivery_status_does_not_reopen(ledger):
+    ledger.record("job-1", ["Push Saturday offers"], "Sales", RECIPIENTS, DEADLINE)
+    ledger.complete("Push Saturday offers", "Sales", DEADLINE)
+    ledger.update_status("job-1", SENT)
+    assert open_counts(ledger) == {}
+    assert ledger.history()[0]["status"] == COMPLETED
+
+
+def test_open_assignments_lists_soonest_first(ledger):
+    ledger.record("job-1", ["Push Saturday offers"], "Sales", RECIPIENTS, DEADLINE)
+    ledger.record("job-2", ["Trim Monday discount"], "Finance", RECIPIENTS, TODAY)
+    ledger.flush()
+    rows = ledger.open_assignments(TODAY)
+    assert [(row["action"], row["team"]) for row in rows] == [
+        ("Trim Monday discount", "Finance"), ("Push Saturday offers", "Sales"),
+    ]
@@ -0,0 +1,152 @@
+import smtplib
+import time
+from email.mime.text import MIMEText
+
+import pytest
+
+from outbox import FAILED, FINISHED, SENT, EmailOutbox
+from smtp_stub import StubSMTPServer
+
+RECEIVERS = ["team@example.com"]
+
+
+def message(subject="Assignment"):
+    msg = MIMEText("body")
+    msg["Subject"] = subject
+    return msg
+
+
+def wait_for(outbox, job_id, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = outbox.status(job_id)
+        if status and status["state"] in FINISHED:
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish: {outbox.status(job_id)}")
+
+
+@pytest.fixture
+def smtp():
+    with StubSMTPServer() as server:
+        yield server
+
+
+@pytest.fixture
+def make_outbox(smtp):
+    outboxes = []
+
+    def make(password="", **kwargs):
+        outbox = EmailOutbox("bi@example.com", password, host="127.0.0.1", port=smtp.port, use_ssl=False,
+                             backoff=0.0, **kwargs)
+        outboxes.append(outbox)
+        return outbox
+
+    yield make
+    for outbox in outboxes:
+        outbox.close()
+
+
+def fail_connections(outbox, errors):
+    """Make the outbox's next connection attempts raise ``errors``, in order."""
+    errors = list(errors)
+    connect = outbox._connection
+
+    def flaky():
+        if errors:
+            raise errors.pop(0)
+        return connect()
+
+    outbox._connection = flaky
+
+
+def test_delivers_once_per_dedupe_key(make_outbox, smtp):
+    states = []
+    outbox = make_outbox(on_status=lambda job_id, state: states.append(state))
+    key = ("Push Saturday offers", "Sales", "2024-11-01")
+    job_id = outbox.submit(RECEIVERS, message(), dedupe_key=key)
+    assert outbox.submit(RECEIVERS, message(), dedupe_key=key) == job_id
+    assert wait_for(outbox, job_id)["state"] == SENT
+    # Still deduped once sent
+    assert outbox.submit(RECEIVERS, message(), dedupe_key=key) == job_id
+    assert len(smtp.messages) == 1
+    assert states == ["sending", SENT]
+
+
+def test_batch_shares_one_connection(make_outbox, smtp):
+    outbox = make_outbox()
+    job_ids = outbox.submit_many([(RECEIVERS, message(f"Digest {team}"), ("digest", team)) for team in "ABC"])
+    assert [wait_for(outbox, job_id)["state"] for job_id in job_ids] == [SENT] * 3
+    assert len(smtp.messages) == 3
+    assert smtp.connections == 1
+
+
+def test_retries_transient_errors(make_outbox, smtp):
+    outbox = make_outbox()
+    fail_connections(outbox, [OSError("connection reset"), smtplib.SMTPServerDisconnected("closed")])
+    status = wait_for(outbox, outbox.submit(RECEIVERS, message()))
+    assert status["state"] == SENT
+    assert status["attempts"] == 3
+    assert status["error"] is None
+    assert len(smtp.messages) == 1
+
+
+def test_gives_up_after_max_retries(make_outbox, smtp):
+    outbox = make_outbox(max_retries=2)
+    fail_connections(outbox, [OSError("down"), OSError("still down")])
+    status = wait_for(outbox, outbox.submit(RECEIVERS, message()))
+    assert status["state"] == FAILED
+    assert status["attempts"] == 2
+    assert status["error"] == "still down"
+    assert smtp.messages == []
+
+
+def test_failed_job_can_be_resubmitted(make_outbox, smtp):
+    outbox = make_outbox()
+    fail_connections(outbox, [smtplib.SMTPAuthenticationError(535, b"bad login")])
+    key = ("Push Saturday offers", "Sales", "2024-11-01")
+    failed = outbox.submit(RECEIVERS, message(), dedupe_key=key)
+    # Permanent errors are not retried
+    assert wait_for(outbox, failed)["attempts"] == 1
+    retried = outbox.submit(RECEIVERS, message(), dedupe_key=key)
+    assert retried != failed
+    assert wait_for(outbox, retried)["state"] == SENT
+    assert len(smtp.messages) == 1
+
+
+def test_finished_jobs_are_forgotten(make_outbox, smtp):
+    outbox = make_outbox(job_ttl=0.0)
+    key = ("Push Saturday offers", "Sales", "2024-11-01")
+    job_id = outbox.submit(RECEIVERS, message(), dedupe_key=key)
+    wait_for(outbox, job_id)
+    other = outbox.submit(RECEIVERS, message())
+    assert outbox.status(job_id) is None
+    assert outbox.submit(RECEIVERS, message(), dedupe_key=key) not in (job_id, other)
+
+
+def test_unexpected_error_fails_only_that_job(make_outbox, smtp):
+    class Unrenderable(MIMEText):
+        def as_string(self, *args, **kwargs):
+            raise ValueError("bad header")
+
+    outbox = make_outbox()
+    status = wait_for(outbox, outbox.submit(RECEIVERS, Unrenderable("body")))
+    assert status["state"] == FAILED
+    assert status["error"] == "bad header"
+    # The worker is still running
+    assert wait_for(outbox, outbox.submit(RECEIVERS, message()))["state"] == SENT
+    assert len(smtp.messages) == 1
+
+
+def test_failed_login_closes_the_connection(make_outbox, smtp, monkeypatch):
+    servers = []
+
+    def refuse(server, user, password):
+        servers.append(server)
+        raise smtplib.SMTPAuthenticationError(535, b"bad login")
+
+    monkeypatch.setattr(smtplib.SMTP, "login", refuse)
+    outbox = make_outbox(password="secret")
+    assert wait_for(outbox, outbox.submit(RECEIVERS, message()))["state"] == FAILED
+    assert len(servers) == 1
+    assert servers[0].sock is None
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+import policy_engine
+from data_store import BILL, BRAND, DISCOUNT, IS_RETURN, REGION, SALES
+from policy_engine import evaluate_grid, prepare
+
+CAPS = [20_000, 60_000, np.inf]
+SPLITS = [10_000, 40_000, np.inf]
+RATES = [None, 4.0, 8.0]
+REDEMPTION = 0.3
+
+
+def replay(df, rate, cap, split, brand=None):
+    """Apply one policy bill by bill; (margin saved, bills affected)."""
+    sold = df[~df[IS_RETURN]].copy()
+    sold["new"] = sold[DISCOUNT]
+    if rate is not None:
+        in_scope = sold[BRAND] == brand if brand else np.ones(len(sold), dtype=bool)
+        limit = (sold[SALES] + sold[DISCOUNT]) * rate / 100
+        sold["new"] = np.where(in_scope, np.minimum(sold[DISCOUNT], limit), sold[DISCOUNT])
+    saved = affected = 0.0
+    for _, bill in sold.groupby(BILL):
+        total = bill["new"].sum()
+        capped = min(total, cap)
+        voucher = max(capped - split, 0.0) if cap > split else 0.0
+        saved += bill[DISCOUNT].sum() - capped + voucher * (1 - REDEMPTION)
+        affected += (bill["new"] < bill[DISCOUNT]).any() or total > min(cap, split)
+    return saved, affected
+
+
+@pytest.mark.parametrize("brand", [None, "Tanishq"])
+def test_grid_matches_a_bill_by_bill_replay(transactions, brand):
+    df = transactions.iloc[:400]
+    grid = evaluate_grid(prepare(df, brand=brand), CAPS, SPLITS, RATES, REDEMPTION)
+    assert len(grid) == len(RATES) * len(CAPS) * len(SPLITS)
+    for row in grid.itertuples():
+        rate = None if np.isnan(row.target_rate) else row.target_rate
+        saved, affected = replay(df, rate, row.cap, row.split, brand)
+        assert row.margin_saved == pytest.approx(saved)
+        assert row.bills_affected == affected
+
+
+def test_worker_processes_give_the_same_grid(transactions, monkeypatch):
+    data = prepare(transactions, region=transactions[REGION].iloc[0])
+    serial = evaluate_grid(data, CAPS, SPLITS, RATES, REDEMPTION)
+    monkeypatch.setattr(policy_engine, "PARALLEL_MIN_ROWS_X_RATES", 0)
+    parallel = evaluate_grid(data, CAPS, SPLITS, RATES, REDEMPTION, workers=2)
+    assert parallel.equals(serial)
@@ -0,0 +1,55 @@
+import datetime
+
+from return_spikes import ALL, WARMUP_DAYS, SpikeDetector
+
+START = datetime.date(2024, 1, 1)
+SEGMENT = ("Tanishq", "Diamond")
+
+
+def feed(detector, days, counts, start=START):
+    """Update ``detector`` with the same ``counts`` for ``days`` days; return every spike."""
+    spikes = []
+    for offset in range(days):
+        # Alternate around the level so the spread is not zero
+        day = {segment: returns + offset % 2 for segment, returns in counts.items()}
+        spikes += detector.update(start + datetime.timedelta(days=offset), day)
+    return spikes
+
+
+def test_flags_a_spike_after_warmup():
+    detector = SpikeDetector()
+    assert feed(detector, WARMUP_DAYS, {SEGMENT: 10}) == []
+    spikes = detector.update(START + datetime.timedelta(days=WARMUP_DAYS), {SEGMENT: 60})
+    assert [(s["brand"], s["stone"]) for s in spikes] == [SEGMENT]
+    assert spikes[0]["returns"] == 60
+    assert spikes[0]["expected"] < 12
+
+
+def test_nothing_flagged_during_warmup():
+    detector = SpikeDetector()
+    feed(detector, 3, {SEGMENT: 10})
+    assert detector.update(START + datetime.timedelta(days=3), {SEGMENT: 60}) == []
+
+
+def test_small_counts_are_not_spikes():
+    detector = SpikeDetector()
+    feed(detector, WARMUP_DAYS, {SEGMENT: 0})
+    assert detector.update(START + datetime.timedelta(days=WARMUP_DAYS), {SEGMENT: 4}) == []
+
+
+def test_segment_first_seen_late_starts_from_zero():
+    # The new segment had no returns on the earlier days, so a burst on its
+    # first day is a spike rather than its baseline
+    detector = SpikeDetector()
+    feed(detector, WARMUP_DAYS, {SEGMENT: 10})
+    spikes = detector.update(START + datetime.timedelta(days=WARMUP_DAYS), {SEGMENT: 10, ("Mia", ALL): 30})
+    assert [(s["brand"], s["stone"]) for s in spikes] == [("Mia", ALL)]
+
+
+def test_state_round_trips_through_frame():
+    detector = SpikeDetector()
+    feed(detector, WARMUP_DAYS, {SEGMENT: 10, ("Zoya", "Polki"): 6})
+    restored = SpikeDetector.from_frame(detector.to_frame(), detector.last_date.isoformat())
+    day = START + datetime.timedelta(days=WARMUP_DAYS)
+    counts = {SEGMENT: 60, ("Mia", ALL): 30}
+    assert restored.update(day, counts) == detector.update(day, counts)
@@ -0,0 +1,27 @@
+import pytest
+
+from data_store import BILL, CUSTOMER, DATE, IS_RETURN, SALES
+from segments import CustomerState, segment_customers
+
+
+def test_bills_split_across_chunks_count_once(transactions, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    transactions.sample(frac=1, random_state=0).to_csv("sales.csv", index=False)
+    df = segment_customers("sales.csv", chunk_rows=97).set_index(CUSTOMER)
+
+    sold = transactions[~transactions[IS_RETURN]]
+    bills = sold.groupby(CUSTOMER)[[DATE, BILL]].apply(
+        lambda rows: len(set(zip(rows[DATE].dt.normalize(), rows[BILL])))
+    )
+    assert df["bills"].reindex(bills.index).tolist() == bills.tolist()
+    assert (df["bills"].drop(bills.index) == 0).all()
+    spend = transactions[SALES].where(~transactions[IS_RETURN], -transactions[SALES]).groupby(transactions[CUSTOMER])
+    assert df["net_spend"].sort_index().round(2).tolist() == spend.sum().sort_index().round(2).tolist()
+
+
+def test_chunks_out_of_date_order_are_rejected(transactions):
+    ordered = transactions.sort_values(DATE)
+    state = CustomerState()
+    state.update(ordered.iloc[1000:])
+    with pytest.raises(ValueError):
+        state.update(ordered.iloc[:1000])